@@ -13,6 +13,7 @@ from flask import (
 )
 
 import utils.gui_utils as gui
+from utils.ffmpeg_progress import read_metrics
 
 # Set the hostname
 HOST = "localhost"
@@ -91,6 +92,12 @@ def videos_json():
     return send_from_directory("video_creation/data", "videos.json")
 
 
+# Make the progress of the running and last renders accessible
+@app.route("/metrics.json")
+def metrics_json():
+    return read_metrics()
+
+
 # Make backgrounds.json accessible
 @app.route("/backgrounds.json")
 def backgrounds_json():
@@ -13,7 +13,7 @@ class GTTS:
     def run(self, text, filepath):
         tts = gTTS(
             text=text,
-            lang=settings.config["reddit"]["thread"]["post_lang"] or "en",
+            lang=settings.get_config()["reddit"]["thread"]["post_lang"] or "en",
             slow=False,
         )
         tts.save(filepath)
@@ -83,7 +83,7 @@ class TikTok:
         headers = {
             "User-Agent": "com.zhiliaoapp.musically/2022600030 (Linux; U; Android 7.1.2; es_ES; SM-G988N; "
             "Build/NRD90M;tt-ok/3.12.13.1)",
-            "Cookie": f"sessionid={settings.config['settings']['tts']['tiktok_sessionid']}",
+            "Cookie": f"sessionid={settings.get_config()['settings']['tts']['tiktok_sessionid']}",
         }
 
         self.URI_BASE = "https://api16-normal-c-useast1a.tiktokv.com/media/api/text/speech/invoke/"
@@ -98,7 +98,7 @@ class TikTok:
             voice = self.random_voice()
         else:
             # if tiktok_voice is not set in the config file, then use a random voice
-            voice = settings.config["settings"]["tts"].get("tiktok_voice", None)
+            voice = settings.get_config()["settings"]["tts"].get("tiktok_voice", None)
 
         # get the audio from the TikTok API
         data = self.get_voices(voice=voice, text=text)
@@ -37,11 +37,11 @@ class AWSPolly:
             if random_voice:
                 voice = self.randomvoice()
             else:
-                if not settings.config["settings"]["tts"]["aws_polly_voice"]:
+                if not settings.get_config()["settings"]["tts"]["aws_polly_voice"]:
                     raise ValueError(
                         f"Please set the TOML variable AWS_VOICE to a valid voice. options are: {voices}"
                     )
-                voice = str(settings.config["settings"]["tts"]["aws_polly_voice"]).capitalize()
+                voice = str(settings.get_config()["settings"]["tts"]["aws_polly_voice"]).capitalize()
             try:
                 # Request speech synthesis
                 response = polly.synthesize_speech(
@@ -17,14 +17,16 @@ class elevenlabs:
         if random_voice:
             voice = self.randomvoice()
         else:
-            voice = str(settings.config["settings"]["tts"]["elevenlabs_voice_name"]).capitalize()
+            voice = str(
+                settings.get_config()["settings"]["tts"]["elevenlabs_voice_name"]
+            ).capitalize()
 
         audio = self.client.generate(text=text, voice=voice, model="eleven_multilingual_v1")
         save(audio=audio, filename=filepath)
 
     def initialize(self):
-        if settings.config["settings"]["tts"]["elevenlabs_api_key"]:
-            api_key = settings.config["settings"]["tts"]["elevenlabs_api_key"]
+        if settings.get_config()["settings"]["tts"]["elevenlabs_api_key"]:
+            api_key = settings.get_config()["settings"]["tts"]["elevenlabs_api_key"]
         else:
             raise ValueError(
                 "You didn't set an Elevenlabs API key! Please set the config variable ELEVENLABS_API_KEY to a valid API key."
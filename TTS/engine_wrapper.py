@@ -1,10 +1,9 @@
 import os
 import re
 from pathlib import Path
-from typing import Tuple
+from typing import Optional, Tuple
 
 import numpy as np
-import translators
 from moviepy.audio.AudioClip import AudioClip
 from moviepy.audio.fx.volumex import volumex
 from moviepy.editor import AudioFileClip
@@ -12,7 +11,9 @@ from rich.progress import track
 
 from utils import settings
 from utils.console import print_step, print_substep
+from utils.text_normalization import add_periods
 from utils.voice import sanitize_text
+from utils.workspace import temp_dir
 
 DEFAULT_MAX_LENGTH: int = (
     50  # Video length variable, edit this on your own risk. It should work, but it's not supported
@@ -36,7 +37,7 @@ class TTSEngine:
         self,
         tts_module,
         reddit_object: dict,
-        path: str = "assets/temp/",
+        path: Optional[str] = None,
         max_length: int = DEFAULT_MAX_LENGTH,
         last_clip_length: int = 0,
     ):
@@ -44,7 +45,8 @@ class TTSEngine:
         self.reddit_object = reddit_object
 
         self.redditid = re.sub(r"[^\w\s-]", "", reddit_object["thread_id"])
-        self.path = path + self.redditid + "/mp3"
+        # the workspace of the running job unless a folder is given
+        self.path = (path + self.redditid if path else temp_dir(self.redditid)) + "/mp3"
         self.max_length = max_length
         self.length = 0
         self.last_clip_length = last_clip_length
@@ -53,18 +55,10 @@ class TTSEngine:
         self,
     ):  # adds periods to the end of paragraphs (where people often forget to put them) so tts doesn't blend sentences
         for comment in self.reddit_object["comments"]:
-            # remove links
-            regex_urls = r"((http|https)\:\/\/)?[a-zA-Z0-9\.\/\?\:@\-_=#]+\.([a-zA-Z]){2,6}([a-zA-Z0-9\.\&\/\?\:@\-_=#])*"
-            comment["comment_body"] = re.sub(regex_urls, " ", comment["comment_body"])
-            comment["comment_body"] = comment["comment_body"].replace("\n", ". ")
-            comment["comment_body"] = re.sub(r"\bAI\b", "A.I", comment["comment_body"])
-            comment["comment_body"] = re.sub(r"\bAGI\b", "A.G.I", comment["comment_body"])
-            if comment["comment_body"][-1] != ".":
-                comment["comment_body"] += "."
-            comment["comment_body"] = comment["comment_body"].replace(". . .", ".")
-            comment["comment_body"] = comment["comment_body"].replace(".. . ", ".")
-            comment["comment_body"] = comment["comment_body"].replace(". . ", ".")
-            comment["comment_body"] = re.sub(r'\."\.', '".', comment["comment_body"])
+            if comment.get("periods_added"):
+                continue  # already normalized by an earlier run on this reddit object
+            comment["comment_body"] = add_periods(comment["comment_body"])
+            comment["periods_added"] = True
 
     def run(self) -> Tuple[int, int]:
         Path(self.path).mkdir(parents=True, exist_ok=True)
@@ -75,13 +69,13 @@ class TTSEngine:
         # processed_text = ##self.reddit_object["thread_post"] != ""
         idx = 0
 
-        if settings.config["settings"]["storymode"]:
-            if settings.config["settings"]["storymodemethod"] == 0:
+        if settings.get_config()["settings"]["storymode"]:
+            if settings.get_config()["settings"]["storymodemethod"] == 0:
                 if len(self.reddit_object["thread_post"]) > self.tts_module.max_chars:
                     self.split_post(self.reddit_object["thread_post"], "postaudio")
                 else:
                     self.call_tts("postaudio", process_text(self.reddit_object["thread_post"]))
-            elif settings.config["settings"]["storymodemethod"] == 1:
+            elif settings.get_config()["settings"]["storymodemethod"] == 1:
                 for idx, text in track(enumerate(self.reddit_object["thread_post"])):
                     self.call_tts(f"postaudio-{idx}", process_text(text))
 
@@ -147,7 +141,7 @@ class TTSEngine:
         self.tts_module.run(
             text,
             filepath=f"{self.path}/{filename}.mp3",
-            random_voice=settings.config["settings"]["tts"]["random_voice"],
+            random_voice=settings.get_config()["settings"]["tts"]["random_voice"],
         )
         # try:
         #     self.length += MP3(f"{self.path}/{filename}.mp3").info.length
@@ -162,7 +156,7 @@ class TTSEngine:
             self.length = 0
 
     def create_silence_mp3(self):
-        silence_duration = settings.config["settings"]["tts"]["silence_duration"]
+        silence_duration = settings.get_config()["settings"]["tts"]["silence_duration"]
         silence = AudioClip(
             make_frame=lambda t: np.sin(440 * 2 * np.pi * t),
             duration=silence_duration,
@@ -173,10 +167,12 @@ class TTSEngine:
 
 
 def process_text(text: str, clean: bool = True):
-    lang = settings.config["reddit"]["thread"]["post_lang"]
+    lang = settings.get_config()["reddit"]["thread"]["post_lang"]
     new_text = sanitize_text(text) if clean else text
     if lang:
         print_substep("Translating Text...")
+        import translators  # slow to import, only needed to translate
+
         translated_text = translators.translate_text(text, translator="google", to_language=lang)
         new_text = sanitize_text(translated_text)
     return new_text
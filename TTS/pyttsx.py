@@ -16,8 +16,8 @@ class pyttsx:
         filepath: str,
         random_voice=False,
     ):
-        voice_id = settings.config["settings"]["tts"]["python_voice"]
-        voice_num = settings.config["settings"]["tts"]["py_voice_num"]
+        voice_id = settings.get_config()["settings"]["tts"]["python_voice"]
+        voice_num = settings.get_config()["settings"]["tts"]["py_voice_num"]
         if voice_id == "" or voice_num == "":
             voice_id = 2
             voice_num = 3
@@ -38,11 +38,13 @@ class StreamlabsPolly:
         if random_voice:
             voice = self.randomvoice()
         else:
-            if not settings.config["settings"]["tts"]["streamlabs_polly_voice"]:
+            if not settings.get_config()["settings"]["tts"]["streamlabs_polly_voice"]:
                 raise ValueError(
                     f"Please set the config variable STREAMLABS_POLLY_VOICE to a valid voice. options are: {voices}"
                 )
-            voice = str(settings.config["settings"]["tts"]["streamlabs_polly_voice"]).capitalize()
+            voice = str(
+                settings.get_config()["settings"]["tts"]["streamlabs_polly_voice"]
+            ).capitalize()
 
         body = {"voice": voice, "text": text, "service": "polly"}
         headers = {"Referer": "https://streamlabs.com/"}
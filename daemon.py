@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+import argparse
+import importlib
+import socket
+import threading
+import traceback
+from contextlib import contextmanager
+from functools import partial
+from pathlib import Path
+from typing import Dict
+
+from flask import Flask, jsonify, request
+
+from utils import job_queue, settings
+from utils.console import print_step, print_substep
+from utils.ffmpeg_install import ffmpeg_install
+from utils.settings import JobContext
+
+# Set the hostname
+HOST = "localhost"
+# Set the port number, next to the one of GUI.py
+PORT = 4001
+# How long an idle worker waits before looking at the queue again, a submit wakes it right away
+POLL_SECONDS = 5
+# How many jobs may run each stage at once, the browser and the render are the heaviest
+STAGE_LIMITS = {"thread": 1, "tts": 2, "screenshots": 1, "background": 2, "render": 1}
+# The modules main.main imports for its stages, imported at warm-up so the first job doesn't pay
+STAGE_MODULES = (
+    "reddit.subreddit",
+    "video_creation.voices",
+    "video_creation.screenshot_downloader",
+    "video_creation.background",
+    "video_creation.final_video",
+)
+
+app = Flask(__name__)
+job_submitted = threading.Event()
+
+
+class JobCancelled(Exception):
+    pass
+
+
+@app.route("/jobs", methods=["POST"])
+def submit():
+    data = request.get_json(silent=True) or request.form
+    overrides = data.get("config") or {}
+    try:
+        # checked now, so a typo fails the request instead of the job
+        JobContext(overrides)
+    except (ValueError, AttributeError) as e:
+        return jsonify({"error": f"Invalid config: {e}"}), 400
+    job_id = job_queue.submit(str(data.get("post_id") or "").strip(), overrides)
+    job_submitted.set()
+    return jsonify(job_queue.get(job_id)), 201
+
+
+@app.route("/jobs", methods=["GET"])
+def jobs():
+    return jsonify(job_queue.list_jobs(request.args.get("limit", 100, type=int)))
+
+
+@app.route("/jobs/<int:job_id>", methods=["GET"])
+def status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "No such job"}), 404
+    return jsonify(job)
+
+
+@app.route("/jobs/<int:job_id>/cancel", methods=["POST"])
+def cancel(job_id):
+    if not job_queue.cancel(job_id):
+        return jsonify({"error": "The job doesn't exist or already finished"}), 409
+    return jsonify(job_queue.get(job_id))
+
+
+class Daemon:
+    """Runs the queued jobs in a pool of workers that share one warm process.
+
+    Args:
+        workers (int): How many jobs run at once
+        limits (Dict[str, int]): How many jobs may run each stage at once
+    """
+
+    def __init__(self, workers: int, limits: Dict[str, int]):
+        self.workers = workers
+        self.semaphores = {stage: threading.BoundedSemaphore(n) for stage, n in limits.items()}
+
+    def warm_up(self):
+        """Loads everything the jobs share once, instead of once per video."""
+        print_step("Warming up the daemon 🔥")
+        for module in STAGE_MODULES:
+            importlib.import_module(module)
+        from reddit.client import get_reddit
+        from video_creation.background import prefetch_in_background
+
+        get_reddit()
+        prefetch_in_background()
+        if settings.config["ai"]["ai_similarity_enabled"]:
+            from utils.ai_methods import get_model
+
+            get_model()
+        if settings.config["settings"]["storymode"]:
+            from utils.posttextparser import get_pipeline
+
+            get_pipeline()
+        print_substep("The daemon is warm.", "bold green")
+
+    @contextmanager
+    def stage(self, job_id: int, name: str):
+        if job_queue.cancel_requested(job_id):
+            raise JobCancelled()
+        job_queue.set_stage(job_id, f"waiting for {name}")
+        with self.semaphores[name]:
+            job_queue.set_stage(job_id, name)
+            yield
+
+    def run_job(self, job: Dict):
+        from main import main
+
+        post_id = job["post_id"] or None
+        print_step(f"Starting job {job['id']} 🎬")
+        try:
+            # a job that was running when the daemon stopped continues from its checkpoints
+            main(
+                post_id,
+                resume=bool(post_id) and job["attempts"] > 1,
+                stage=partial(self.stage, job["id"]),
+                context=JobContext(job["config"]),
+            )
+        except JobCancelled:
+            job_queue.finish(job["id"], "cancelled")
+            print_substep(f"Job {job['id']} was cancelled.")
+        except BaseException:  # the stages call exit() when they give up
+            job_queue.finish(job["id"], "failed", traceback.format_exc())
+            print_substep(f"Job {job['id']} failed, see its error with GET /jobs/{job['id']}", "red")
+        else:
+            job_queue.finish(job["id"], "done")
+            print_substep(f"Job {job['id']} is done.", "bold green")
+
+    def work(self, worker: str):
+        while True:
+            job = job_queue.claim(worker)
+            if job is None:
+                job_submitted.wait(POLL_SECONDS)
+                job_submitted.clear()
+                continue
+            self.run_job(job)
+
+    def start(self):
+        requeued = job_queue.requeue_running()
+        if requeued:
+            print_substep(f"Resuming {requeued} jobs of the last run.")
+        self.warm_up()
+        for i in range(self.workers):
+            threading.Thread(
+                target=self.work,
+                args=(f"{socket.gethostname()}-{i}",),
+                name=f"worker-{i}",
+                daemon=True,
+            ).start()
+
+
+def parse_limits(values) -> Dict[str, int]:
+    limits = dict(STAGE_LIMITS)
+    for value in values:
+        stage, _, limit = value.partition("=")
+        if stage not in limits or not limit.isdigit() or int(limit) < 1:
+            raise ValueError(f"Invalid stage limit {value}")
+        limits[stage] = int(limit)
+    return limits
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Make the videos submitted over HTTP")
+    parser.add_argument("--workers", type=int, default=2, help="How many jobs run at once")
+    parser.add_argument(
+        "--limit",
+        action="append",
+        default=[],
+        metavar="STAGE=N",
+        help=f"How many jobs may run a stage at once, the stages are {', '.join(STAGE_LIMITS)}",
+    )
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+    try:
+        limits = parse_limits(args.limit)
+    except ValueError as e:
+        parser.error(str(e))
+
+    ffmpeg_install()
+    directory = Path().absolute()
+    config = settings.check_toml(
+        f"{directory}/utils/.config.template.toml", f"{directory}/config.toml"
+    )
+    config is False and exit()
+
+    Daemon(args.workers, limits).start()
+    print_step(f"Taking jobs on http://{args.host}:{args.port}/jobs 📬")
+    app.run(host=args.host, port=args.port, threaded=True)
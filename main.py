@@ -1,34 +1,30 @@
 #!/usr/bin/env python
+import argparse
 import math
 import sys
+from contextlib import nullcontext
 from os import name
 from pathlib import Path
 from subprocess import Popen
-from typing import NoReturn
+from typing import Callable, ContextManager, NoReturn, Optional
 
 from prawcore import ResponseException
 
-from reddit.subreddit import get_subreddit_threads
 from utils import settings
-from utils.cleanup import cleanup
+from utils.checkpoint import Checkpoint
 from utils.console import print_markdown, print_step, print_substep
 from utils.ffmpeg_install import ffmpeg_install
 from utils.id import id
+from utils.settings import JobContext
 from utils.version import checkversion
-from video_creation.background import (
-    chop_background,
-    download_background_audio,
-    download_background_video,
-    get_background_config,
-)
-from video_creation.final_video import make_final_video
-from video_creation.screenshot_downloader import get_screenshots_of_reddit_posts
-from video_creation.voices import save_text_to_mp3
+from utils.workspace import Workspace, print_usage
 
 __VERSION__ = "3.3.0"
 
-print(
-    """
+
+def print_banner() -> None:
+    print(
+        """
 ██████╗ ███████╗██████╗ ██████╗ ██╗████████╗    ██╗   ██╗██╗██████╗ ███████╗ ██████╗     ███╗   ███╗ █████╗ ██╗  ██╗███████╗██████╗
 ██╔══██╗██╔════╝██╔══██╗██╔══██╗██║╚══██╔══╝    ██║   ██║██║██╔══██╗██╔════╝██╔═══██╗    ████╗ ████║██╔══██╗██║ ██╔╝██╔════╝██╔══██╗
 ██████╔╝█████╗  ██║  ██║██║  ██║██║   ██║       ██║   ██║██║██║  ██║█████╗  ██║   ██║    ██╔████╔██║███████║█████╔╝ █████╗  ██████╔╝
@@ -36,43 +32,135 @@ print(
 ██║  ██║███████╗██████╔╝██████╔╝██║   ██║        ╚████╔╝ ██║██████╔╝███████╗╚██████╔╝    ██║ ╚═╝ ██║██║  ██║██║  ██╗███████╗██║  ██║
 ╚═╝  ╚═╝╚══════╝╚═════╝ ╚═════╝ ╚═╝   ╚═╝         ╚═══╝  ╚═╝╚═════╝ ╚══════╝ ╚═════╝     ╚═╝     ╚═╝╚═╝  ╚═╝╚═╝  ╚═╝╚══════╝╚═╝  ╚═╝
 """
-)
-print_markdown(
-    "### Thanks for using this tool! Feel free to contribute to this project on GitHub! If you have any questions, feel free to join my Discord server or submit a GitHub issue. You can find solutions to many common problems in the documentation: https://reddit-video-maker-bot.netlify.app/"
-)
-checkversion(__VERSION__)
+    )
+    print_markdown(
+        "### Thanks for using this tool! Feel free to contribute to this project on GitHub! If you have any questions, feel free to join my Discord server or submit a GitHub issue. You can find solutions to many common problems in the documentation: https://reddit-video-maker-bot.netlify.app/"
+    )
+
 
+def no_limit(stage: str) -> ContextManager:
+    return nullcontext()
+
+
+def main(
+    POST_ID=None,
+    resume: bool = False,
+    stage: Callable[[str], ContextManager] = no_limit,
+    context: Optional[JobContext] = None,
+) -> None:
+    """Makes a video in a workspace of its own, checkpointing every stage.
+
+    Args:
+        POST_ID (str): Id of the post to use, picked from the subreddit if not given
+        resume (bool): Continue the last job that didn't finish (of the given post), skipping the
+            stages whose outputs are still intact
+        stage (Callable): Called with the name of every stage that runs, the stage runs inside the
+            context it returns. The daemon uses it to limit how many jobs run a stage at once
+        context (JobContext): Settings of the job, a snapshot of the config if not given
+    """
+    # The stages are imported when they run, so that starting the bot stays fast
+    from reddit.subreddit import get_subreddit_threads
+    from utils.subreddit import picked_posts, release
 
-def main(POST_ID=None) -> None:
     global redditid, reddit_object
-    reddit_object = get_subreddit_threads(POST_ID)
-    redditid = id(reddit_object)
-    length, number_of_comments = save_text_to_mp3(reddit_object)
+    # every stage reads the settings of this job, not the ones of a job running next to it
+    with (context or JobContext()).activate(), picked_posts() as picked:
+        try:
+            checkpoint = Checkpoint.latest(POST_ID) if resume else None
+            if checkpoint is not None and checkpoint.is_done("thread"):
+                print_step(f"Resuming the video of {checkpoint.reddit_id} ⏯")
+                reddit_object = checkpoint.result("thread")
+                redditid = id(reddit_object)
+            else:
+                with stage("thread"):
+                    reddit_object = get_subreddit_threads(POST_ID)
+                redditid = id(reddit_object)
+                checkpoint = Checkpoint(Workspace.create(redditid), reddit_object["thread_id"])
+                checkpoint.save("thread", reddit_object)
+            with checkpoint.workspace.activate():
+                make_video(checkpoint, reddit_object, stage)
+        finally:
+            # also when the thread stage failed after picking a post
+            for reddit_id in picked:
+                release(reddit_id)
+
+
+def make_video(
+    checkpoint: Checkpoint, reddit_object: dict, stage: Callable[[str], ContextManager] = no_limit
+) -> None:
+    """Runs the stages after the thread stage, skipping those already done."""
+    from video_creation.background import (
+        chop_background,
+        download_background_audio,
+        download_background_video,
+        get_background_config,
+    )
+    from video_creation.final_video import make_final_video
+    from video_creation.screenshot_downloader import get_screenshots_of_reddit_posts
+    from video_creation.voices import save_text_to_mp3
+
+    if checkpoint.is_done("tts"):
+        print_substep("Reusing the voice over.")
+        tts = checkpoint.result("tts")
+        # the tts stage edits the texts, the later stages need them as it left them
+        reddit_object = tts["reddit_object"]
+        length, number_of_comments = tts["length"], tts["number_of_comments"]
+    else:
+        with stage("tts"):
+            length, number_of_comments = save_text_to_mp3(reddit_object)
+        checkpoint.save(
+            "tts",
+            {
+                "length": length,
+                "number_of_comments": number_of_comments,
+                "reddit_object": reddit_object,
+            },
+            ["mp3"],
+        )
     length = math.ceil(length)
-    get_screenshots_of_reddit_posts(reddit_object, number_of_comments)
-    bg_config = {
-        "video": get_background_config("video"),
-        "audio": get_background_config("audio"),
-    }
-    download_background_video(bg_config["video"])
-    download_background_audio(bg_config["audio"])
-    chop_background(bg_config, length, reddit_object)
-    make_final_video(number_of_comments, length, reddit_object, bg_config)
-
-
-def run_many(times) -> None:
+
+    if checkpoint.is_done("screenshots"):
+        print_substep("Reusing the screenshots.")
+    else:
+        with stage("screenshots"):
+            get_screenshots_of_reddit_posts(reddit_object, number_of_comments)
+        checkpoint.save("screenshots", outputs=["png"])
+
+    if checkpoint.is_done("background"):
+        print_substep("Reusing the background.")
+        bg_config = checkpoint.result("background")
+        # the audio is mixed from the library in the render
+        download_background_audio(bg_config["audio"])
+    else:
+        bg_config = {
+            "video": get_background_config("video"),
+            "audio": get_background_config("audio"),
+        }
+        with stage("background"):
+            download_background_video(bg_config["video"])
+            download_background_audio(bg_config["audio"])
+            chop_background(bg_config, length, reddit_object)
+        checkpoint.save("background", bg_config, ["background.mp4"])
+    print_substep("Disk usage of the stages:")
+    print_usage(checkpoint.workspace)
+    with stage("render"):
+        make_final_video(number_of_comments, length, reddit_object, bg_config)
+
+
+def run_many(times, resume: bool = False) -> None:
     for x in range(1, times + 1):
         print_step(
             f'on the {x}{("th", "st", "nd", "rd", "th", "th", "th", "th", "th", "th")[x % 10]} iteration of {times}'
         )  # correct 1st 2nd 3rd 4th 5th....
-        main()
+        # only the first run can have been interrupted
+        main(resume=resume and x == 1)
         Popen("cls" if name == "nt" else "clear", shell=True).wait()
 
 
 def shutdown() -> NoReturn:
     if "redditid" in globals():
-        print_markdown("## Clearing temp files")
-        cleanup(redditid)
+        # kept for --resume, the temp quota evicts them when they are the oldest
+        print_markdown("## Keeping the temp files, run with --resume to continue the video")
 
     print("Exiting...")
     sys.exit()
@@ -84,6 +172,15 @@ if __name__ == "__main__":
             "Hey! Congratulations, you've made it so far (which is pretty rare with no Python 3.10). Unfortunately, this program only works on Python 3.10. Please install Python 3.10 and try again."
         )
         sys.exit()
+    parser = argparse.ArgumentParser(description="Make videos from Reddit posts")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue the last video that didn't finish, skipping the stages already done",
+    )
+    args = parser.parse_args()
+    print_banner()
+    checkversion(__VERSION__)
     ffmpeg_install()
     directory = Path().absolute()
     config = settings.check_toml(
@@ -107,12 +204,12 @@ if __name__ == "__main__":
                 print_step(
                     f'on the {index}{("st" if index % 10 == 1 else ("nd" if index % 10 == 2 else ("rd" if index % 10 == 3 else "th")))} post of {len(config["reddit"]["thread"]["post_id"].split("+"))}'
                 )
-                main(post_id)
+                main(post_id, resume=args.resume)
                 Popen("cls" if name == "nt" else "clear", shell=True).wait()
         elif config["settings"]["times_to_run"]:
-            run_many(config["settings"]["times_to_run"])
+            run_many(config["settings"]["times_to_run"], resume=args.resume)
         else:
-            main()
+            main(resume=args.resume)
     except KeyboardInterrupt:
         shutdown()
     except ResponseException:
@@ -0,0 +1,172 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import praw
+from prawcore.exceptions import ResponseException
+
+from utils import settings
+from utils.console import print_substep
+from utils.voice import sleep_until
+
+TOKEN_PATH = "video_creation/data/reddit_token.json"
+# Wait for the rate limit to reset once fewer requests than this are left
+MIN_REMAINING_REQUESTS = 10
+
+_lock = threading.Lock()
+_reddit = None
+
+
+def _token_key() -> str:
+    creds = settings.config["reddit"]["creds"]
+    return f"{creds['client_id']}:{creds['username']}"
+
+
+def _load_tokens() -> dict:
+    try:
+        with open(TOKEN_PATH, "r", encoding="utf-8") as token_file:
+            return json.load(token_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _authorizer(reddit: praw.Reddit):
+    """Returns the prawcore authorizer of the client, or None if this prawcore version doesn't have
+    the (private) attributes the token cache needs. The bot then logs in normally every time."""
+    authorizer = getattr(getattr(reddit, "_core", None), "_authorizer", None)
+    if authorizer is None or not all(
+        hasattr(authorizer, name)
+        for name in ("access_token", "_expiration_timestamp", "scopes", "refresh")
+    ):
+        return None
+    return authorizer
+
+
+def cached_token() -> dict:
+    """Returns the cached OAuth token, or None if there is none that is valid for another minute."""
+    token = _load_tokens().get(_token_key())
+    if token is None or token["expiration"] <= time.time() + 60:
+        return None
+    return token
+
+
+def load_token(authorizer) -> bool:
+    """Gives the authorizer the cached OAuth token if it has not expired yet.
+
+    Returns:
+        bool: Whether a cached token was used
+    """
+    token = cached_token()
+    if token is None:
+        return False
+    authorizer.access_token = token["access_token"]
+    authorizer._expiration_timestamp = token["expiration"]
+    authorizer.scopes = set(token["scopes"]) if token["scopes"] is not None else None
+    return True
+
+
+def save_token(authorizer):
+    """Caches the authorizer's OAuth token in TOKEN_PATH, readable by the current user only."""
+    if authorizer.access_token is None or authorizer._expiration_timestamp is None:
+        return
+    tokens = _load_tokens()
+    tokens[_token_key()] = {
+        "access_token": authorizer.access_token,
+        "expiration": authorizer._expiration_timestamp,
+        "scopes": sorted(authorizer.scopes) if authorizer.scopes is not None else None,
+    }
+    Path(TOKEN_PATH).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{TOKEN_PATH}.{os.getpid()}.tmp"
+    with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as token_file:
+        json.dump(tokens, token_file)
+    os.replace(tmp_path, TOKEN_PATH)
+
+
+def login() -> praw.Reddit:
+    """Creates an authenticated Reddit client, reusing the cached OAuth token when possible."""
+    print_substep("Logging into Reddit.")
+
+    creds = settings.config["reddit"]["creds"]
+    # The token of a 2FA account isn't cached: praw refreshes it with the password it was given, and
+    # the one time code in it is expired by then
+    if creds["2fa"]:
+        print("\nEnter your two-factor authentication code from your authenticator app.\n")
+        code = input("> ")
+        print()
+        pw = creds["password"]
+        passkey = f"{pw}:{code}"
+    else:
+        passkey = creds["password"]
+    username = creds["username"]
+    if str(username).casefold().startswith("u/"):
+        username = username[2:]
+    try:
+        reddit = praw.Reddit(
+            client_id=creds["client_id"],
+            client_secret=creds["client_secret"],
+            user_agent="Accessing Reddit threads",
+            username=username,
+            passkey=passkey,
+            check_for_async=False,
+        )
+    except ResponseException as e:
+        if e.response.status_code == 401:
+            print("Invalid credentials - please check them in config.toml")
+        raise
+    except:
+        print("Something went wrong...")
+        raise
+
+    authorizer = _authorizer(reddit)
+    if authorizer is None or creds["2fa"]:
+        return reddit
+    try:
+        load_token(authorizer)
+    except (KeyError, TypeError):  # a token cache this version can't read
+        pass
+    refresh = authorizer.refresh
+
+    def refresh_and_save():
+        refresh()
+        try:
+            save_token(authorizer)
+        except (AttributeError, TypeError, OSError) as e:
+            print_substep(f"Couldn't cache the Reddit token: {e}", "red")
+
+    authorizer.refresh = refresh_and_save
+    return reddit
+
+
+def get_reddit() -> praw.Reddit:
+    """Returns the Reddit client of this process, logging in on the first call.
+
+    Every caller shares the client, so they share its OAuth token and its rate limit as well.
+    """
+    global _reddit
+    with _lock:
+        if _reddit is None:
+            _reddit = login()
+    wait_for_rate_limit()
+    return _reddit
+
+
+def wait_for_rate_limit(min_remaining: int = MIN_REMAINING_REQUESTS):
+    """Sleeps until Reddit's rate limit resets if the client has almost no requests left.
+
+    The limits come from the rate limit headers of the client's last response.
+    """
+    if _reddit is None:
+        return
+    limits = _reddit.auth.limits
+    if (
+        limits["remaining"] is not None
+        and limits["remaining"] < min_remaining
+        and limits["reset_timestamp"]
+    ):
+        print_substep(
+            f"Only {int(limits['remaining'])} Reddit requests left. Sleeping for "
+            f"{int(limits['reset_timestamp'] - time.time())} seconds."
+        )
+        sleep_until(limits["reset_timestamp"])
@@ -1,56 +1,39 @@
 import re
+from itertools import islice
 
-import praw
 from praw.models import MoreComments
-from prawcore.exceptions import ResponseException
 
+from reddit.client import get_reddit
 from utils import settings
-from utils.ai_methods import sort_by_similarity
+from utils.candidate_pool import candidates
 from utils.console import print_step, print_substep
-from utils.posttextparser import posttextparser
 from utils.subreddit import get_subreddit_undone
 from utils.videos import check_done
 from utils.voice import sanitize_text
 
+# Comments fetched with the post, praw asks for up to 2048 by default
+COMMENT_LIMIT = 100
+COMMENT_SORT = "confidence"  # Reddit's "best" order
+# Read speed of the fastest voices, used to estimate how much comment text fills a video
+CHARS_PER_SECOND = 20
+LENGTH_MARGIN = 1.5  # comments are collected until they fill the video this many times over
+# Candidates ranked by similarity to the keywords, and how many of the best are tried
+RANKED_CANDIDATES = 500
+RANKED_TOP_K = 50
+
 
 def get_subreddit_threads(POST_ID: str):
     """
     Returns a list of threads from the AskReddit subreddit.
     """
 
-    print_substep("Logging into Reddit.")
-
+    reddit = get_reddit()
     content = {}
-    if settings.config["reddit"]["creds"]["2fa"]:
-        print("\nEnter your two-factor authentication code from your authenticator app.\n")
-        code = input("> ")
-        print()
-        pw = settings.config["reddit"]["creds"]["password"]
-        passkey = f"{pw}:{code}"
-    else:
-        passkey = settings.config["reddit"]["creds"]["password"]
-    username = settings.config["reddit"]["creds"]["username"]
-    if str(username).casefold().startswith("u/"):
-        username = username[2:]
-    try:
-        reddit = praw.Reddit(
-            client_id=settings.config["reddit"]["creds"]["client_id"],
-            client_secret=settings.config["reddit"]["creds"]["client_secret"],
-            user_agent="Accessing Reddit threads",
-            username=username,
-            passkey=passkey,
-            check_for_async=False,
-        )
-    except ResponseException as e:
-        if e.response.status_code == 401:
-            print("Invalid credentials - please check them in config.toml")
-    except:
-        print("Something went wrong...")
 
     # Ask user for subreddit input
     print_step("Getting subreddit threads...")
     similarity_score = 0
-    if not settings.config["reddit"]["thread"][
+    if not settings.get_config()["reddit"]["thread"][
         "subreddit"
     ]:  # note to user. you can have multiple subreddits via reddit.subreddit("redditdev+learnpython")
         try:
@@ -62,7 +45,7 @@ def get_subreddit_threads(POST_ID: str):
             subreddit = reddit.subreddit("askreddit")
             print_substep("Subreddit not defined. Using AskReddit.")
     else:
-        sub = settings.config["reddit"]["thread"]["subreddit"]
+        sub = settings.get_config()["reddit"]["thread"]["subreddit"]
         print_substep(f"Using subreddit: r/{sub} from TOML config")
         subreddit_choice = sub
         if str(subreddit_choice).casefold().startswith("r/"):  # removes the r/ from the input
@@ -73,29 +56,35 @@ def get_subreddit_threads(POST_ID: str):
         submission = reddit.submission(id=POST_ID)
 
     elif (
-        settings.config["reddit"]["thread"]["post_id"]
-        and len(str(settings.config["reddit"]["thread"]["post_id"]).split("+")) == 1
+        settings.get_config()["reddit"]["thread"]["post_id"]
+        and len(str(settings.get_config()["reddit"]["thread"]["post_id"]).split("+")) == 1
     ):
-        submission = reddit.submission(id=settings.config["reddit"]["thread"]["post_id"])
-    elif settings.config["ai"]["ai_similarity_enabled"]:  # ai sorting based on comparison
-        threads = subreddit.hot(limit=50)
-        keywords = settings.config["ai"]["ai_similarity_keywords"].split(",")
+        submission = reddit.submission(id=settings.get_config()["reddit"]["thread"]["post_id"])
+    elif settings.get_config()["ai"]["ai_similarity_enabled"]:  # ai sorting based on comparison
+        from utils.ranking import sort_by_similarity  # imports torch and transformers
+
+        threads = islice(candidates(subreddit), RANKED_CANDIDATES)
+        keywords = settings.get_config()["ai"]["ai_similarity_keywords"].split(",")
         keywords = [keyword.strip() for keyword in keywords]
         # Reformat the keywords for printing
         keywords_print = ", ".join(keywords)
         print(f"Sorting threads by similarity to the given keywords: {keywords_print}")
-        threads, similarity_scores = sort_by_similarity(threads, keywords)
+        threads, similarity_scores = sort_by_similarity(threads, keywords, k=RANKED_TOP_K)
         submission, similarity_score = get_subreddit_undone(
             threads, subreddit, similarity_scores=similarity_scores
         )
     else:
-        threads = subreddit.hot(limit=25)
-        submission = get_subreddit_undone(threads, subreddit)
+        submission = get_subreddit_undone(candidates(subreddit), subreddit)
 
     if submission is None:
-        return get_subreddit_threads(POST_ID)  # submission already done. rerun
+        print_substep("No posts left to make a video of. Try another subreddit.", style="bold red")
+        exit()
+
+    # Must be set before any attribute is read, that's when the post is fetched with its comments
+    submission.comment_limit = COMMENT_LIMIT
+    submission.comment_sort = COMMENT_SORT
 
-    elif not submission.num_comments and settings.config["settings"]["storymode"] == "false":
+    if not submission.num_comments and settings.get_config()["settings"]["storymode"] == "false":
         print_substep("No comments found. Skipping.")
         exit()
 
@@ -122,39 +111,45 @@ def get_subreddit_threads(POST_ID: str):
     content["thread_id"] = submission.id
     content["is_nsfw"] = submission.over_18
     content["comments"] = []
-    if settings.config["settings"]["storymode"]:
-        if settings.config["settings"]["storymodemethod"] == 1:
+    if settings.get_config()["settings"]["storymode"]:
+        if settings.get_config()["settings"]["storymodemethod"] == 1:
+            from utils.posttextparser import posttextparser  # imports spacy
+
             content["thread_post"] = posttextparser(submission.selftext)
         else:
             content["thread_post"] = submission.selftext
     else:
+        from TTS.engine_wrapper import DEFAULT_MAX_LENGTH
+
+        target_length = DEFAULT_MAX_LENGTH * CHARS_PER_SECOND * LENGTH_MARGIN
+        text_length = 0
         for top_level_comment in submission.comments:
+            if text_length >= target_length:
+                break  # enough comments to fill the video
             if isinstance(top_level_comment, MoreComments):
                 continue
 
             if top_level_comment.body in ["[removed]", "[deleted]"]:
                 continue  # # see https://github.com/JasonLovesDoggo/RedditVideoMakerBot/issues/78
-            if not top_level_comment.stickied:
-                sanitised = sanitize_text(top_level_comment.body)
-                if not sanitised or sanitised == " ":
-                    continue
-                if len(top_level_comment.body) <= int(
-                    settings.config["reddit"]["thread"]["max_comment_length"]
-                ):
-                    if len(top_level_comment.body) >= int(
-                        settings.config["reddit"]["thread"]["min_comment_length"]
-                    ):
-                        if (
-                            top_level_comment.author is not None
-                            and sanitize_text(top_level_comment.body) is not None
-                        ):  # if errors occur with this change to if not.
-                            content["comments"].append(
-                                {
-                                    "comment_body": top_level_comment.body,
-                                    "comment_url": top_level_comment.permalink,
-                                    "comment_id": top_level_comment.id,
-                                }
-                            )
+            if top_level_comment.stickied or top_level_comment.author is None:
+                continue
+            if not (
+                int(settings.get_config()["reddit"]["thread"]["min_comment_length"])
+                <= len(top_level_comment.body)
+                <= int(settings.get_config()["reddit"]["thread"]["max_comment_length"])
+            ):
+                continue
+            sanitised = sanitize_text(top_level_comment.body)
+            if not sanitised or sanitised == " ":
+                continue
+            content["comments"].append(
+                {
+                    "comment_body": top_level_comment.body,
+                    "comment_url": top_level_comment.permalink,
+                    "comment_id": top_level_comment.id,
+                }
+            )
+            text_length += len(sanitised)
 
     print_substep("Received subreddit threads Successfully.", style="bold green")
     return content
@@ -1,6 +1,30 @@
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List
+
 import numpy as np
 import torch
-from transformers import AutoModel, AutoTokenizer
+from transformers import AutoConfig, AutoModel, AutoTokenizer
+
+from utils import settings
+from utils.console import print_substep
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+ONNX_PATH = "assets/models/all-MiniLM-L6-v2.onnx"
+# Embeddings of different backends differ slightly, so each backend has its own cache
+EMBEDDINGS_PATH = "video_creation/data/embeddings-{backend}.npz"
+BACKENDS = ("torch", "quantized", "onnx")
+# Embeddings kept per backend, about 1.5 KB each. The least recently used ones are evicted first
+MAX_CACHED_EMBEDDINGS = 20000
+# Texts encoded at once, bounds the size of the padded tensors
+BATCH_SIZE = 64
+
+_model_lock = threading.Lock()
+_models = {}
+_cache_lock = threading.Lock()
+_caches = {}
 
 
 # Mean Pooling - Take attention mask into account for correct averaging
@@ -12,53 +36,165 @@ def mean_pooling(model_output, attention_mask):
     )
 
 
-# This function sort the given threads based on their total similarity with the given keywords
-def sort_by_similarity(thread_objects, keywords):
-    # Initialize tokenizer + model.
-    tokenizer = AutoTokenizer.from_pretrained("sentence-transformers/all-MiniLM-L6-v2")
-    model = AutoModel.from_pretrained("sentence-transformers/all-MiniLM-L6-v2")
+class OnnxModel:
+    """Runs the exported model with onnxruntime, called like the transformers model."""
 
-    # Transform the generator to a list of Submission Objects, so we can sort later based on context similarity to
-    # keywords
-    thread_objects = list(thread_objects)
+    def __init__(self, path: str, config):
+        import onnxruntime
 
-    threads_sentences = []
-    for i, thread in enumerate(thread_objects):
-        threads_sentences.append(" ".join([thread.title, thread.selftext]))
+        self.config = config
+        self.session = onnxruntime.InferenceSession(path, providers=["CPUExecutionProvider"])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
 
-    # Threads inference
-    encoded_threads = tokenizer(
-        threads_sentences, padding=True, truncation=True, return_tensors="pt"
+    def __call__(self, **inputs):
+        feed = {name: inputs[name].numpy() for name in self.input_names}
+        return (torch.from_numpy(self.session.run(None, feed)[0]),)
+
+
+def export_onnx(model, tokenizer, path: str = ONNX_PATH):
+    """Exports the model to an ONNX graph with dynamic batch and sequence sizes."""
+    print_substep(f"Exporting {MODEL_NAME} to {path}...")
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    sample = tokenizer(["An example sentence"], return_tensors="pt")
+    input_names = list(sample.keys())
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    torch.onnx.export(
+        model,
+        tuple(sample[name] for name in input_names),
+        tmp_path,
+        input_names=input_names,
+        output_names=["last_hidden_state"],
+        dynamic_axes={
+            **{name: {0: "batch", 1: "sequence"} for name in input_names},
+            "last_hidden_state": {0: "batch", 1: "sequence"},
+        },
+        opset_version=14,
     )
-    with torch.no_grad():
-        threads_embeddings = model(**encoded_threads)
-    threads_embeddings = mean_pooling(threads_embeddings, encoded_threads["attention_mask"])
-
-    # Keywords inference
-    encoded_keywords = tokenizer(keywords, padding=True, truncation=True, return_tensors="pt")
-    with torch.no_grad():
-        keywords_embeddings = model(**encoded_keywords)
-    keywords_embeddings = mean_pooling(keywords_embeddings, encoded_keywords["attention_mask"])
-
-    # Compare every keyword w/ every thread embedding
-    threads_embeddings_tensor = torch.tensor(threads_embeddings)
-    total_scores = torch.zeros(threads_embeddings_tensor.shape[0])
-    cosine_similarity = torch.nn.CosineSimilarity()
-    for keyword_embedding in keywords_embeddings:
-        keyword_embedding = torch.tensor(keyword_embedding).repeat(
-            threads_embeddings_tensor.shape[0], 1
+    os.replace(tmp_path, path)
+
+
+def get_backend() -> str:
+    backend = settings.get_config()["ai"]["ai_backend"] or "torch"
+    if backend not in BACKENDS:
+        print_substep(f"Unknown AI backend {backend}. Using torch.", "red")
+        return "torch"
+    return backend
+
+
+def load_model(backend: str):
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+    if backend == "onnx":
+        try:
+            import onnxruntime  # noqa: F401
+        except ImportError:
+            print_substep("The onnx backend needs onnxruntime (pip install onnxruntime).", "red")
+            raise
+        if not os.path.exists(ONNX_PATH):
+            export_onnx(AutoModel.from_pretrained(MODEL_NAME).eval(), tokenizer)
+        # The torch model is only needed once, to export it
+        return tokenizer, OnnxModel(ONNX_PATH, AutoConfig.from_pretrained(MODEL_NAME))
+    model = AutoModel.from_pretrained(MODEL_NAME).eval()
+    if backend == "quantized":
+        # int8 weights for the linear layers, which hold nearly all of the compute
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return tokenizer, model
+
+
+def get_model(backend: str = None):
+    """Returns the tokenizer and model of a backend, loaded on the first call and shared by the
+    whole process.
+
+    Args:
+        backend (str, optional): torch, quantized (dynamic int8) or onnx (onnxruntime). Defaults
+            to ai.ai_backend.
+    """
+    backend = backend or get_backend()
+    with _model_lock:
+        if backend not in _models:
+            _models[backend] = load_model(backend)
+    return _models[backend]
+
+
+def _load_cache(backend: str) -> Dict[str, np.ndarray]:
+    if backend not in _caches:
+        try:
+            with np.load(EMBEDDINGS_PATH.format(backend=backend)) as cache_file:
+                _caches[backend] = dict(zip(cache_file["keys"].tolist(), cache_file["vectors"]))
+        except (FileNotFoundError, OSError, KeyError, ValueError):
+            _caches[backend] = {}
+    return _caches[backend]
+
+
+def _save_cache(backend: str):
+    path = EMBEDDINGS_PATH.format(backend=backend)
+    cache = _caches[backend]
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(
+        tmp_path,
+        keys=np.array(list(cache), dtype=str),
+        vectors=np.stack(list(cache.values())).astype(np.float32),
+    )
+    os.replace(tmp_path, path)
+
+
+def thread_text(thread) -> str:
+    return " ".join([thread.title, thread.selftext])
+
+
+def thread_key(thread) -> str:
+    """Cache key of a thread, its content hash makes edited threads get a new embedding."""
+    checksum = hashlib.sha1(thread_text(thread).encode("utf-8")).hexdigest()
+    return f"thread:{thread.id}:{checksum}"
+
+
+def embed(texts: List[str], batch_size: int = BATCH_SIZE, backend: str = None) -> torch.Tensor:
+    """Returns the mean pooled embeddings of the texts.
+
+    The texts are encoded in batches of similar length, so a batch is only padded to the longest
+    of its own texts and memory stays bounded however many texts there are.
+    """
+    tokenizer, model = get_model(backend)
+    encoded = tokenizer(texts, truncation=True)
+    order = sorted(range(len(texts)), key=lambda index: len(encoded["input_ids"][index]))
+    embeddings = torch.empty(len(texts), model.config.hidden_size)
+    for start in range(0, len(order), batch_size):
+        batch = order[start : start + batch_size]
+        padded = tokenizer.pad(
+            {key: [encoded[key][index] for index in batch] for key in encoded.keys()},
+            return_tensors="pt",
         )
-        similarity = cosine_similarity(keyword_embedding, threads_embeddings_tensor)
-        total_scores += similarity
+        with torch.no_grad():
+            output = model(**padded)
+        embeddings[batch] = mean_pooling(output, padded["attention_mask"])
+    return embeddings
 
-    similarity_scores, indices = torch.sort(total_scores, descending=True)
 
-    threads_sentences = np.array(threads_sentences)[indices.numpy()]
+def get_embeddings(keys: List[str], texts: List[str]) -> torch.Tensor:
+    """Returns the embeddings of the texts, computing only those missing from EMBEDDINGS_PATH.
 
-    thread_objects = np.array(thread_objects)[indices.numpy()].tolist()
+    The cache keeps the MAX_CACHED_EMBEDDINGS most recently used embeddings and is only written
+    when new ones were computed.
 
-    # print('Similarity Thread Ranking')
-    # for i, thread in enumerate(thread_objects):
-    #    print(f'{i}) {threads_sentences[i]} score {similarity_scores[i]}')
+    Args:
+        keys (List[str]): Cache key of every text
+        texts (List[str]): The texts to embed
 
-    return thread_objects, similarity_scores
+    Returns:
+        torch.Tensor: One embedding per text
+    """
+    backend = get_backend()
+    with _cache_lock:
+        # the cache is ordered from least to most recently used, and saved in that order
+        cache = _load_cache(backend)
+        result = {key: cache.pop(key) for key in keys if key in cache}
+        missing = {key: text for key, text in zip(keys, texts) if key not in result}
+        if missing:
+            vectors = embed(list(missing.values()), backend=backend).numpy().astype(np.float32)
+            result.update(zip(missing, vectors))
+        cache.update(result)
+        if missing:
+            for key in list(cache)[: max(0, len(cache) - MAX_CACHED_EMBEDDINGS)]:
+                del cache[key]
+            _save_cache(backend)
+        return torch.from_numpy(np.stack([result[key] for key in keys]))
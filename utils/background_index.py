@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import subprocess
+import threading
+from bisect import bisect_right
+from pathlib import Path
+from typing import Dict, List
+
+import ffmpeg
+
+from utils.console import print_step, print_substep
+
+BACKGROUNDS_DIR = "assets/backgrounds"
+INDEX_PATH = f"{BACKGROUNDS_DIR}/index.json"
+
+_lock = threading.Lock()
+_index = None
+
+
+def _load_index() -> Dict[str, Dict]:
+    global _index
+    if _index is None:
+        try:
+            with open(INDEX_PATH, "r", encoding="utf-8") as index_file:
+                _index = json.load(index_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            _index = {}
+    return _index
+
+
+def _save_index():
+    Path(INDEX_PATH).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{INDEX_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as index_file:
+        json.dump(_index, index_file, indent=4)
+    os.replace(tmp_path, INDEX_PATH)
+
+
+def file_checksum(path: str) -> str:
+    """Returns the sha256 of a file, read in chunks so multi-GB files don't end up in memory."""
+    checksum = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def probe_keyframes(path: str) -> List[float]:
+    """Returns the timestamps of the video keyframes, read from the packet flags without decoding."""
+    result = subprocess.run(
+        [
+            "ffprobe",
+            "-v",
+            "error",
+            "-select_streams",
+            "v:0",
+            "-show_entries",
+            "packet=pts_time,flags",
+            "-of",
+            "csv=p=0",
+            path,
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    keyframes = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(",")
+        if "K" in flags and pts_time not in ("", "N/A"):
+            keyframes.append(float(pts_time))
+    return sorted(keyframes)
+
+
+def probe_media(path: str) -> Dict:
+    """Reads the metadata of a background file with ffprobe."""
+    probe = ffmpeg.probe(path)
+    info = {
+        "duration": float(probe["format"]["duration"]),
+        "size": os.path.getsize(path),
+        "mtime": os.path.getmtime(path),
+        "checksum": file_checksum(path),
+    }
+    video = next((s for s in probe["streams"] if s["codec_type"] == "video"), None)
+    if video is not None:
+        numerator, _, denominator = video.get("avg_frame_rate", "0/0").partition("/")
+        info.update(
+            {
+                "width": int(video["width"]),
+                "height": int(video["height"]),
+                "fps": float(numerator) / float(denominator) if float(denominator or 0) else 0.0,
+                "codec": video["codec_name"],
+                "keyframes": probe_keyframes(path),
+            }
+        )
+    else:
+        audio = next(s for s in probe["streams"] if s["codec_type"] == "audio")
+        info["codec"] = audio["codec_name"]
+    return info
+
+
+def get_media_info(path: str) -> Dict:
+    """Returns the indexed metadata of a file in assets/backgrounds, probing it only if it changed.
+
+    Args:
+        path (str): Path of the background file
+
+    Returns:
+        Dict: duration, size, mtime, checksum and codec, plus width, height, fps and keyframes of videos
+    """
+    key = Path(path).as_posix()
+    stat = os.stat(path)
+    with _lock:
+        info = _load_index().get(key)
+    if info is not None and info["mtime"] == stat.st_mtime and info["size"] == stat.st_size:
+        return info
+    # probed without the lock, hashing a multi-GB file mustn't hold up the lookups of other jobs
+    print_substep(f"Indexing {path}...")
+    info = probe_media(path)
+    with _lock:
+        _load_index()[key] = info
+        _save_index()
+    return info
+
+
+def snap_to_keyframe(time: float, keyframes: List[float]) -> float:
+    """Returns the last keyframe at or before time, so a stream copy starts exactly there."""
+    position = bisect_right(keyframes, time)
+    return keyframes[position - 1] if position else time
+
+
+def update_index() -> int:
+    """Indexes every new or changed file in assets/backgrounds and forgets the deleted ones.
+
+    Returns:
+        int: The number of indexed files
+    """
+    paths = [
+        path.as_posix()
+        for folder in ("video", "audio")
+        for path in Path(BACKGROUNDS_DIR, folder).rglob("*")
+        if path.is_file()
+        and not path.name.endswith((".part", ".tmp", ".tmp.mp4", ".ytdl", ".download"))
+    ]
+    for path in paths:
+        get_media_info(path)
+    with _lock:
+        index = _load_index()
+        for key in set(index) - set(paths):
+            del index[key]
+        _save_index()
+    return len(paths)
+
+
+if __name__ == "__main__":
+    print_step("Indexing the backgrounds 🗂")
+    print_substep(f"{update_index()} backgrounds are indexed in {INDEX_PATH}", style="bold green")
@@ -0,0 +1,114 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, Iterator
+
+from reddit.client import wait_for_rate_limit
+from utils import ledger
+from utils.console import print_substep
+
+POOL_PATH = "video_creation/data/candidates.json"
+PAGE_SIZE = 100  # the most Reddit returns per request
+
+# The listings searched for a new post, in order, with how long a fetched listing stays fresh
+LISTINGS = [
+    ("hot", None, 15 * 60),
+    ("top", "day", 60 * 60),
+    ("top", "week", 6 * 60 * 60),
+    ("top", "month", 24 * 60 * 60),
+    ("top", "year", 7 * 24 * 60 * 60),
+    ("top", "all", 7 * 24 * 60 * 60),
+]
+# The submission attributes kept in the pool, enough to filter and rank the posts without Reddit
+FIELDS = ("id", "title", "selftext", "over_18", "stickied", "num_comments", "is_self")
+
+_lock = threading.Lock()
+_pool = None
+
+
+def _load_pool() -> Dict[str, Dict]:
+    global _pool
+    if _pool is None:
+        try:
+            with open(POOL_PATH, "r", encoding="utf-8") as pool_file:
+                _pool = json.load(pool_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            _pool = {}
+    return _pool
+
+
+def _save_pool():
+    Path(POOL_PATH).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{POOL_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as pool_file:
+        json.dump(_pool, pool_file, ensure_ascii=False)
+    os.replace(tmp_path, POOL_PATH)
+
+
+def _get_listing(subreddit, sort: str, time_filter: str, ttl: int) -> Dict:
+    """Returns the cached state of a listing, starting it over once it is older than ttl."""
+    listings = _load_pool().setdefault(subreddit.display_name.lower(), {})
+    key = f"{sort}:{time_filter}" if time_filter else sort
+    state = listings.get(key)
+    if state is None or time.time() - state["fetched"] > ttl:
+        state = listings[key] = {"fetched": time.time(), "after": None, "done": False, "posts": []}
+    return state
+
+
+def _fetch_page(subreddit, sort: str, time_filter: str, state: Dict):
+    """Fetches the next page of a listing, continuing from its pagination cursor."""
+    print_substep(f"Fetching {sort} {time_filter or ''} posts of r/{subreddit.display_name}...")
+    wait_for_rate_limit()
+    params = {"after": state["after"]} if state["after"] else {}
+    if time_filter:
+        page = list(subreddit.top(time_filter=time_filter, limit=PAGE_SIZE, params=params))
+    else:
+        page = list(getattr(subreddit, sort)(limit=PAGE_SIZE, params=params))
+    state["posts"].extend({field: getattr(post, field) for field in FIELDS} for post in page)
+    state["after"] = page[-1].fullname if page else None
+    state["done"] = len(page) < PAGE_SIZE
+    _save_pool()
+
+
+def candidates(subreddit) -> Iterator[SimpleNamespace]:
+    """Yields the posts of a subreddit that are not in the ledger yet, hot posts first.
+
+    Listings are fetched a page at a time and only when the posts before them are used up, then
+    kept in POOL_PATH until they go stale, so most runs don't download any listing at all.
+
+    Args:
+        subreddit (praw.models.Subreddit): Subreddit to search
+
+    Yields:
+        SimpleNamespace: Snapshots with the attributes in FIELDS, see to_submission
+    """
+    seen = set()
+    for sort, time_filter, ttl in LISTINGS:
+        position = 0
+        fetched = None
+        while True:
+            with _lock:
+                state = _get_listing(subreddit, sort, time_filter, ttl)
+                if state["fetched"] != fetched:  # went stale and started over, from its first post
+                    position = 0
+                    fetched = state["fetched"]
+                if position >= len(state["posts"]):
+                    if state["done"]:
+                        break
+                    _fetch_page(subreddit, sort, time_filter, state)
+                    if position >= len(state["posts"]):
+                        break
+                post = state["posts"][position]
+            position += 1
+            if post["id"] in seen or ledger.is_done(post["id"]):
+                continue
+            seen.add(post["id"])
+            yield SimpleNamespace(**post)
+
+
+def to_submission(subreddit, candidate: SimpleNamespace):
+    """Returns the (lazy) praw Submission of a candidate, it is fetched once it's used."""
+    return subreddit._reddit.submission(id=candidate.id)
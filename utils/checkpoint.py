@@ -0,0 +1,101 @@
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from utils import ledger
+from utils.background_index import file_checksum
+from utils.console import print_substep
+from utils.workspace import Workspace, workspaces
+
+MANIFEST_NAME = "manifest.json"
+# The stages of main.main, in order. Running a stage again invalidates the stages after it.
+STAGES = ("thread", "tts", "screenshots", "background")
+# Rewritten by make_final_video on every render, so its checksum says nothing about the stage
+UNCHECKED_FILES = {"png/title.png"}
+
+
+class Checkpoint:
+    """The manifest of a job's workspace: the result of every finished stage and the checksums of
+    the files it wrote, so a resumed run can skip the stages whose files are still intact.
+
+    Args:
+        workspace (Workspace): Workspace of the job
+        reddit_id (str): Id of the post, read from the manifest if not given
+    """
+
+    def __init__(self, workspace: Workspace, reddit_id: Optional[str] = None):
+        self.workspace = workspace
+        self.directory = workspace.path
+        self.path = f"{self.directory}/{MANIFEST_NAME}"
+        try:
+            with open(self.path, "r", encoding="utf-8") as manifest_file:
+                manifest = json.load(manifest_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            manifest = {"reddit_id": reddit_id, "stages": {}}
+        self.reddit_id: str = reddit_id or manifest["reddit_id"]
+        self.manifest: Dict[str, Dict] = manifest["stages"]
+
+    @classmethod
+    def latest(cls, reddit_id: Optional[str] = None) -> Optional["Checkpoint"]:
+        """Returns the checkpoint of the most recently interrupted job, if there is one.
+
+        Args:
+            reddit_id (str): Only look at the jobs of this post
+        """
+        for workspace in reversed(workspaces()):
+            if workspace.is_active() or not Path(workspace.path, MANIFEST_NAME).is_file():
+                continue
+            checkpoint = cls(workspace)
+            if reddit_id not in (None, checkpoint.reddit_id) or ledger.is_done(checkpoint.reddit_id):
+                continue
+            return checkpoint
+        return None
+
+    def _checksums(self, outputs: List[str]) -> Dict[str, str]:
+        checksums = {}
+        for output in outputs:
+            path = Path(self.directory, output)
+            files = sorted(path.rglob("*")) if path.is_dir() else [path]
+            for file in files:
+                relative_path = file.relative_to(self.directory).as_posix()
+                if file.is_file() and relative_path not in UNCHECKED_FILES:
+                    checksums[relative_path] = file_checksum(str(file))
+        return checksums
+
+    def is_done(self, stage: str) -> bool:
+        """Checks that a stage finished and that none of its files changed or went missing."""
+        entry = self.manifest.get(stage)
+        if entry is None:
+            return False
+        for file, checksum in entry["files"].items():
+            path = Path(self.directory, file)
+            if not path.is_file() or file_checksum(str(path)) != checksum:
+                print_substep(f"{file} changed since the {stage} stage, running it again.")
+                return False
+        return True
+
+    def result(self, stage: str) -> Any:
+        return self.manifest[stage]["result"]
+
+    def save(self, stage: str, result: Any = None, outputs: List[str] = ()):
+        """Records a finished stage and forgets the stages after it, which have to run again.
+
+        Args:
+            stage (str): One of STAGES
+            result (Any): What the stage returned, must be JSON serializable
+            outputs (List[str]): Files and folders the stage wrote, relative to the workspace
+        """
+        for later_stage in STAGES[STAGES.index(stage) + 1 :]:
+            self.manifest.pop(later_stage, None)
+        self.manifest[stage] = {"result": result, "files": self._checksums(outputs)}
+        Path(self.directory).mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as manifest_file:
+            json.dump(
+                {"reddit_id": self.reddit_id, "stages": self.manifest},
+                manifest_file,
+                ensure_ascii=False,
+                indent=4,
+            )
+        os.replace(tmp_path, self.path)
@@ -1,20 +1,10 @@
-import os
-import shutil
-from os.path import exists
-
-
-def _listdir(d):  # listdir with full path
-    return [os.path.join(d, f) for f in os.listdir(d)]
+from utils.workspace import Workspace, temp_dir
 
 
 def cleanup(reddit_id) -> int:
-    """Deletes all temporary assets in assets/temp
+    """Deletes the temporary files of a post, the workspace of the running job if there is one
 
     Returns:
         int: How many files were deleted
     """
-    directory = f"../assets/temp/{reddit_id}/"
-    if exists(directory):
-        shutil.rmtree(directory)
-
-        return 1
+    return Workspace(temp_dir(reddit_id)).remove()
@@ -0,0 +1,172 @@
+import argparse
+import os
+import re
+import subprocess
+import tempfile
+import time
+from typing import Dict, List
+
+import ffmpeg
+
+from utils import settings
+from utils.console import print_step, print_substep, print_table
+
+# ffmpeg output options of every encoding profile, selected with settings.encoding_profile.
+# r is the output frame rate, profiles without it keep the frame rate of the background.
+ENCODING_PROFILES: Dict[str, Dict] = {
+    # Quick previews, fast to encode and to seek through
+    "draft": {
+        "c:v": "libx264",
+        "preset": "ultrafast",
+        "tune": "fastdecode",
+        "crf": 30,
+        "r": 30,
+        "g": 30,
+        "b:a": "96k",
+    },
+    "standard": {
+        "c:v": "libx264",
+        "preset": "veryfast",
+        "crf": 21,
+        "maxrate": "12M",
+        "bufsize": "24M",
+        "r": 30,
+        "g": 60,
+        "b:a": "192k",
+    },
+    "archive": {
+        "c:v": "libx264",
+        "preset": "slow",
+        "crf": 17,
+        "g": 120,
+        "b:a": "256k",
+    },
+    # The settings used before profiles existed, the default so existing videos look the same
+    "legacy": {
+        "c:v": "h264",
+        "b:v": "20M",
+        "b:a": "192k",
+    },
+}
+
+DEFAULT_PROFILE = "legacy"
+
+
+def get_encoding_profile(name: str = None, bitrate: str = None) -> Dict:
+    """Returns the ffmpeg output options of an encoding profile.
+
+    Args:
+        name (str, optional): Name of the profile. Defaults to settings.encoding_profile, or legacy.
+        bitrate (str, optional): A fixed video bitrate that replaces the quality based rate control.
+
+    Returns:
+        Dict: A copy of the profile's ffmpeg output options
+    """
+    if name is None:
+        name = settings.get_config()["settings"]["encoding_profile"] or DEFAULT_PROFILE
+    if name not in ENCODING_PROFILES:
+        print_substep(
+            f"Unknown encoding profile {name}. Using the {DEFAULT_PROFILE} profile.", "red"
+        )
+        name = DEFAULT_PROFILE
+    profile = dict(ENCODING_PROFILES[name])
+    if bitrate:
+        for option in ("crf", "maxrate", "bufsize"):
+            profile.pop(option, None)
+        profile["b:v"] = bitrate
+    return profile
+
+
+def make_fixture(directory: str, duration: int) -> str:
+    """Writes the lossless benchmark fixture: a 1080p test pattern with moving text and a tone."""
+    path = os.path.join(directory, "fixture.mkv")
+    video = ffmpeg.input(f"testsrc2=size=1920x1080:rate=30:duration={duration}", f="lavfi")
+    video = video.drawtext(
+        text="%{pts}",
+        x="(w-text_w)/2",
+        y="h-t*40",
+        fontsize=64,
+        fontcolor="white",
+        fontfile=os.path.join("fonts", "Roboto-Bold.ttf"),
+    )
+    audio = ffmpeg.input(f"sine=frequency=440:duration={duration}", f="lavfi")
+    ffmpeg.output(
+        video, audio, path, **{"c:v": "libx264", "qp": 0, "preset": "ultrafast", "c:a": "flac"}
+    ).overwrite_output().run(quiet=True)
+    return path
+
+
+def reference_frames(fixture: str, W: int, H: int):
+    """The fixture cropped and scaled the same way make_final_video does it."""
+    return ffmpeg.input(fixture).video.filter("crop", f"ih*({W}/{H})", "ih").filter("scale", W, H)
+
+
+def compare(distorted: str, fixture: str, W: int, H: int, metric: str) -> float:
+    """Compares an encode to the fixture with the psnr or libvmaf filter.
+
+    Returns:
+        float: The average score, or None if the metric is unavailable
+    """
+    graph = ffmpeg.filter([ffmpeg.input(distorted).video, reference_frames(fixture, W, H)], metric)
+    try:
+        _, stderr = ffmpeg.output(graph, "-", f="null").run(quiet=True)
+    except ffmpeg.Error:
+        return None
+    pattern = r"average:([\d.]+)" if metric == "psnr" else r"VMAF score: ([\d.]+)"
+    match = re.search(pattern, stderr.decode("utf8"))
+    return float(match[1]) if match else None
+
+
+def has_vmaf() -> bool:
+    filters = subprocess.run(["ffmpeg", "-hide_banner", "-filters"], capture_output=True, text=True)
+    return "libvmaf" in filters.stdout
+
+
+def benchmark(profiles: List[str], duration: int = 10, W: int = 1080, H: int = 1920) -> List[Dict]:
+    """Renders the benchmark fixture through every profile.
+
+    Returns:
+        List[Dict]: Wall time, encode fps, output size and quality of every profile
+    """
+    results = []
+    vmaf = has_vmaf()
+    with tempfile.TemporaryDirectory() as directory:
+        print_substep("Creating the benchmark fixture...")
+        fixture = make_fixture(directory, duration)
+        for name in profiles:
+            print_substep(f"Encoding with the {name} profile...")
+            path = os.path.join(directory, f"{name}.mp4")
+            start = time.perf_counter()
+            ffmpeg.output(
+                reference_frames(fixture, W, H),
+                ffmpeg.input(fixture).audio,
+                path,
+                f="mp4",
+                **get_encoding_profile(name),
+            ).overwrite_output().run(quiet=True)
+            wall_time = time.perf_counter() - start
+            results.append(
+                {
+                    "profile": name,
+                    "wall_time": wall_time,
+                    "fps": duration * 30 / wall_time,
+                    "size_mb": os.path.getsize(path) / 1024 / 1024,
+                    "psnr": compare(path, fixture, W, H, "psnr"),
+                    "vmaf": compare(path, fixture, W, H, "libvmaf") if vmaf else None,
+                }
+            )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the encoding profiles")
+    parser.add_argument("profiles", nargs="*", default=list(ENCODING_PROFILES))
+    parser.add_argument("--duration", type=int, default=10, help="Fixture length in seconds")
+    args = parser.parse_args()
+
+    print_step("Benchmarking the encoding profiles 🏁")
+    print_table(
+        f"{result['profile']}: {result['wall_time']:.1f}s, {result['fps']:.0f} fps, "
+        f"{result['size_mb']:.1f} MB, PSNR {result['psnr'] or 'n/a'}, VMAF {result['vmaf'] or 'n/a'}"
+        for result in benchmark(args.profiles, args.duration)
+    )
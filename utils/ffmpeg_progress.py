@@ -0,0 +1,184 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import ffmpeg
+
+from utils.console import print_substep
+
+METRICS_PATH = "video_creation/data/render_metrics.json"
+# The render trace is rotated when it grows over this size, see TraceSink
+TRACE_MAX_BYTES = 10 * 1024 * 1024
+# The metrics file keeps the latest renders only, and a render publishes at most once a second
+METRICS_MAX_RENDERS = 20
+METRICS_INTERVAL = 1.0
+
+# A sink is called with every progress event, see parse_progress for its keys
+ProgressSink = Callable[[Dict], None]
+
+
+def parse_progress(block: Dict[str, str], duration: float) -> Dict:
+    """Turns one block of ffmpeg's -progress key=value output into an event.
+
+    Returns:
+        Dict: frame, fps, bitrate (kbit/s), speed (x realtime), out_time (s), total_size (bytes),
+        progress (0 to 1) and done (bool). Values ffmpeg reports as N/A are None.
+    """
+
+    def number(key, suffix=""):
+        value = block.get(key, "N/A").strip().removesuffix(suffix)
+        try:
+            return float(value)
+        except ValueError:
+            return None
+
+    out_time_us = number("out_time_us")
+    out_time = out_time_us / 1000000 if out_time_us is not None and out_time_us >= 0 else None
+    return {
+        "frame": number("frame"),
+        "fps": number("fps"),
+        "bitrate": number("bitrate", "kbits/s"),
+        "speed": number("speed", "x"),
+        "out_time": out_time,
+        "total_size": number("total_size"),
+        "progress": min(out_time / duration, 1.0) if out_time is not None and duration else None,
+        "done": block.get("progress") == "end",
+    }
+
+
+def run_ffmpeg(stream, duration: float, sinks: List[ProgressSink]):
+    """Runs an ffmpeg-python stream and sends its progress to every sink while it renders.
+
+    ffmpeg writes its progress to a pipe instead of a temporary file, so nothing is left behind.
+
+    Args:
+        stream: The ffmpeg-python output(s) to run.
+        duration (float): The length of the output, used to compute the progress.
+        sinks (List[ProgressSink]): Called with every progress event.
+
+    Raises:
+        ffmpeg.Error: If ffmpeg fails, with its stderr attached like ffmpeg-python's run does.
+    """
+    process = stream.global_args("-progress", "pipe:1", "-nostats").run_async(
+        pipe_stdout=True, pipe_stderr=True
+    )
+    stderr = []
+    # stderr has to be drained as well, or ffmpeg blocks once the pipe buffer is full
+    stderr_reader = threading.Thread(
+        target=lambda: stderr.append(process.stderr.read()), name="ffmpeg-stderr", daemon=True
+    )
+    stderr_reader.start()
+
+    block = {}
+    for line in iter(process.stdout.readline, b""):
+        key, _, value = line.decode("utf8", "replace").strip().partition("=")
+        block[key] = value
+        if key == "progress":
+            event = parse_progress(block, duration)
+            for sink in sinks:
+                sink(event)
+            block = {}
+
+    process.wait()
+    stderr_reader.join()
+    if process.returncode:
+        raise ffmpeg.Error("ffmpeg", None, b"".join(stderr))
+
+
+class TqdmSink:
+    """Shows the progress in a tqdm progress bar."""
+
+    def __init__(self, desc: str = "Progress: "):
+        from tqdm import tqdm
+
+        self.pbar = tqdm(total=100, desc=desc, bar_format="{l_bar}{bar}", unit=" %")
+
+    def __call__(self, event: Dict):
+        status = 100 if event["done"] else round((event["progress"] or 0) * 100, 2)
+        self.pbar.update(status - self.pbar.n)
+        if event["speed"] is not None:
+            self.pbar.set_postfix_str(f"{event['speed']}x")
+        if event["done"]:
+            self.pbar.close()
+
+
+class TraceSink:
+    """Appends every event as a line of JSON to a trace file.
+
+    Once the file grows over max_bytes it is moved to <path>.1, replacing the previous one, so the
+    traces take at most twice max_bytes.
+    """
+
+    def __init__(self, path: str, max_bytes: int = TRACE_MAX_BYTES, **fields):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.fields = fields  # added to every line, e.g. the reddit id
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+    def __call__(self, event: Dict):
+        try:
+            if os.path.getsize(self.path) >= self.max_bytes:
+                os.replace(self.path, f"{self.path}.1")
+        except FileNotFoundError:
+            pass  # not written yet, or just rotated by another render
+        with open(self.path, "a", encoding="utf-8") as trace:
+            trace.write(json.dumps({"time": time.time(), **self.fields, **event}) + "\n")
+
+
+class MetricsSink:
+    """Publishes the latest event of a render to METRICS_PATH (served by the GUI at /metrics.json).
+
+    The file is written at most every METRICS_INTERVAL seconds and when the render is done, and
+    only keeps the METRICS_MAX_RENDERS most recently updated renders.
+
+    Args:
+        name (str): Key of this render in the metrics file.
+        slow_speed (float): Warn once when the encode runs slower than this multiple of realtime.
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, name: str, slow_speed: float = 0.5):
+        self.name = name
+        self.slow_speed = slow_speed
+        self.warned = False
+        self.published = 0.0
+
+    def __call__(self, event: Dict):
+        if (
+            not self.warned
+            and event["speed"] is not None
+            and (event["out_time"] or 0) > 5  # the speed is unreliable in the first seconds
+            and event["speed"] < self.slow_speed
+        ):
+            self.warned = True
+            print_substep(
+                f"The render runs at {event['speed']}x realtime, slower than {self.slow_speed}x",
+                "bold red",
+            )
+        now = time.time()
+        if not event["done"] and now - self.published < METRICS_INTERVAL:
+            return
+        self.published = now
+        with self._lock:
+            metrics = read_metrics()
+            metrics.pop(self.name, None)  # moved to the end, so the oldest renders come first
+            metrics[self.name] = {"time": now, "slow": self.warned, **event}
+            for name in list(metrics)[:-METRICS_MAX_RENDERS]:
+                del metrics[name]
+            Path(METRICS_PATH).parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = f"{METRICS_PATH}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as metrics_file:
+                json.dump(metrics, metrics_file, indent=4)
+            os.replace(tmp_path, METRICS_PATH)
+
+
+def read_metrics() -> Dict:
+    try:
+        with open(METRICS_PATH, "r", encoding="utf-8") as metrics_file:
+            return json.load(metrics_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
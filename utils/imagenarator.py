@@ -7,6 +7,7 @@ from rich.progress import track
 
 from TTS.engine_wrapper import process_text
 from utils.fonts import getheight, getsize
+from utils.workspace import temp_dir
 
 
 def draw_multiple_line_text(
@@ -72,4 +73,4 @@ def imagemaker(theme, reddit_obj: dict, txtclr, padding=5, transparent=False) ->
         image = Image.new("RGBA", size, theme)
         text = process_text(text, False)
         draw_multiple_line_text(image, text, font, txtclr, padding, wrap=30, transparent=transparent)
-        image.save(f"assets/temp/{id}/png/img{idx}.png")
+        image.save(f"{temp_dir(id)}/png/img{idx}.png")
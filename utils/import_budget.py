@@ -0,0 +1,85 @@
+import argparse
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+from utils.console import print_step, print_substep, print_table
+
+# Only the stage that needs them may import these
+HEAVY_MODULES = (
+    "torch",
+    "transformers",
+    "spacy",
+    "playwright",
+    "moviepy",
+    "yt_dlp",
+    "translators",
+    "boto3",
+    "elevenlabs",
+)
+
+
+def measure_imports(module: str) -> Dict[str, Tuple[int, int]]:
+    """Imports a module in a fresh interpreter with -X importtime.
+
+    Returns:
+        Dict[str, Tuple[int, int]]: The self and cumulative import time (us) of every imported module
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_time, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = (int(self_time), int(cumulative))
+    return times
+
+
+def check_budget(module: str, budget_ms: float, top: int = 10) -> List[str]:
+    """Checks the import time of a module against a budget and that it imports no heavy module.
+
+    Returns:
+        List[str]: The problems found, empty if the module is within budget
+    """
+    times = measure_imports(module)
+    total_ms = times[module][1] / 1000
+    slowest = sorted(
+        ((name, cumulative) for name, (_, cumulative) in times.items() if "." not in name),
+        key=lambda item: item[1],
+        reverse=True,
+    )
+    print_substep(f"import {module}: {total_ms:.0f} ms (budget {budget_ms:.0f} ms)")
+    print_table(f"{name}: {cumulative / 1000:.0f} ms" for name, cumulative in slowest[:top])
+
+    problems = []
+    if total_ms > budget_ms:
+        problems.append(
+            f"import {module} takes {total_ms:.0f} ms, over its {budget_ms:.0f} ms budget"
+        )
+    for heavy in HEAVY_MODULES:
+        if heavy in times:
+            problems.append(f"import {module} imports {heavy}, which should be imported lazily")
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the import time of the entry points")
+    parser.add_argument("modules", nargs="*", default=["main"])
+    parser.add_argument("--budget-ms", type=float, default=500)
+    args = parser.parse_args()
+
+    print_step("Measuring the import times ⏱")
+    problems = [
+        problem for module in args.modules for problem in check_budget(module, args.budget_ms)
+    ]
+    for problem in problems:
+        print_substep(problem, "bold red")
+    if not problems:
+        print_substep("All imports are within budget.", "bold green")
+    sys.exit(1 if problems else 0)
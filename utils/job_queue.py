@@ -0,0 +1,159 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+JOBS_PATH = "./video_creation/data/jobs.db"
+# A job is queued, then running, and ends up done, failed or cancelled
+FINISHED = ("done", "failed", "cancelled")
+
+_local = threading.local()
+
+
+def connect() -> sqlite3.Connection:
+    """Returns this thread's connection to the job queue, creating the queue on first use.
+
+    Like the ledger it runs in WAL mode, so the daemon and the HTTP API can use it at the same time.
+    """
+    connection = getattr(_local, "connection", None)
+    if connection is not None:
+        return connection
+    connection = sqlite3.connect(JOBS_PATH, timeout=30, isolation_level=None)
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute(
+        """CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            post_id TEXT NOT NULL DEFAULT '',
+            config TEXT NOT NULL DEFAULT '{}',
+            status TEXT NOT NULL DEFAULT 'queued',
+            stage TEXT NOT NULL DEFAULT '',
+            cancel_requested INTEGER NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            worker TEXT NOT NULL DEFAULT '',
+            error TEXT NOT NULL DEFAULT '',
+            created INTEGER NOT NULL,
+            started INTEGER,
+            finished INTEGER
+        )"""
+    )
+    columns = [row["name"] for row in connection.execute("PRAGMA table_info(jobs)")]
+    if "config" not in columns:  # made before the jobs had settings of their own
+        connection.execute("ALTER TABLE jobs ADD COLUMN config TEXT NOT NULL DEFAULT '{}'")
+    _local.connection = connection
+    return connection
+
+
+def submit(post_id: str = "", config: Optional[Dict] = None) -> int:
+    """Queues a video of the given post, or of the next post of the subreddit if none is given.
+
+    Args:
+        post_id (str): Id of the post
+        config (Dict, optional): Settings of the job that differ from the config, see JobContext
+
+    Returns:
+        int: Id of the job
+    """
+    cursor = connect().execute(
+        "INSERT INTO jobs (post_id, config, created) VALUES (?, ?, ?)",
+        (post_id, json.dumps(config or {}), int(time.time())),
+    )
+    return cursor.lastrowid
+
+
+def _to_job(row: sqlite3.Row) -> Dict:
+    job = dict(row)
+    job["config"] = json.loads(job["config"])
+    return job
+
+
+def get(job_id: int) -> Optional[Dict]:
+    row = connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return _to_job(row) if row is not None else None
+
+
+def list_jobs(limit: int = 100) -> List[Dict]:
+    """Returns the latest jobs, newest first."""
+    rows = connect().execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+    return [_to_job(row) for row in rows]
+
+
+def claim(worker: str) -> Optional[Dict]:
+    """Takes the oldest queued job, so that no other worker can take it too.
+
+    Returns:
+        Optional[Dict]: The job, None if the queue is empty
+    """
+    connection = connect()
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        row = connection.execute(
+            "SELECT id FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1"
+        ).fetchone()
+        if row is not None:
+            connection.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, "
+                "started = ? WHERE id = ?",
+                (worker, int(time.time()), row["id"]),
+            )
+        connection.execute("COMMIT")
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    return get(row["id"]) if row is not None else None
+
+
+def set_stage(job_id: int, stage: str):
+    connect().execute("UPDATE jobs SET stage = ? WHERE id = ?", (stage, job_id))
+
+
+def cancel(job_id: int) -> bool:
+    """Cancels a queued job right away, a running one stops before its next stage.
+
+    Returns:
+        bool: False if the job doesn't exist or already finished
+    """
+    connection = connect()
+    cursor = connection.execute(
+        "UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status = 'queued'",
+        (int(time.time()), job_id),
+    )
+    if cursor.rowcount:
+        return True
+    cursor = connection.execute(
+        "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,)
+    )
+    return bool(cursor.rowcount)
+
+
+def cancel_requested(job_id: int) -> bool:
+    row = connect().execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return bool(row and row["cancel_requested"])
+
+
+def finish(job_id: int, status: str, error: str = ""):
+    """Records how a job ended, one of FINISHED."""
+    connect().execute(
+        "UPDATE jobs SET status = ?, error = ?, finished = ? WHERE id = ?",
+        (status, error, int(time.time()), job_id),
+    )
+
+
+def requeue_running() -> int:
+    """Puts the jobs a stopped daemon left running back in the queue, they resume where they were.
+
+    Returns:
+        int: The number of requeued jobs
+    """
+    connection = connect()
+    connection.execute(
+        "UPDATE jobs SET status = 'cancelled', finished = ? "
+        "WHERE status = 'running' AND cancel_requested",
+        (int(time.time()),),
+    )
+    cursor = connection.execute(
+        "UPDATE jobs SET status = 'queued', worker = '' WHERE status = 'running'"
+    )
+    return cursor.rowcount
@@ -0,0 +1,117 @@
+import json
+import os
+import sqlite3
+import threading
+from os.path import exists
+from typing import Dict, List
+
+LEDGER_PATH = "./video_creation/data/videos.db"
+# Kept up to date for the GUI and for anything else that reads the old format
+JSON_EXPORT_PATH = "./video_creation/data/videos.json"
+
+_local = threading.local()
+
+
+def connect() -> sqlite3.Connection:
+    """Returns this thread's connection to the ledger, creating the ledger on first use.
+
+    The ledger runs in WAL mode so several processes can read while one writes, and writers
+    wait for each other instead of failing. A new ledger imports the old videos.json.
+    """
+    connection = getattr(_local, "connection", None)
+    if connection is not None:
+        return connection
+    is_new = not exists(LEDGER_PATH)
+    connection = sqlite3.connect(LEDGER_PATH, timeout=30)
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute(
+        """CREATE TABLE IF NOT EXISTS videos (
+            id TEXT PRIMARY KEY,
+            subreddit TEXT NOT NULL DEFAULT '',
+            time INTEGER NOT NULL,
+            reddit_title TEXT NOT NULL DEFAULT '',
+            filename TEXT NOT NULL DEFAULT '',
+            background_credit TEXT NOT NULL DEFAULT ''
+        )"""
+    )
+    _local.connection = connection
+    if is_new:
+        import_json(connection)
+        export_json()
+    return connection
+
+
+def import_json(connection: sqlite3.Connection, path: str = JSON_EXPORT_PATH) -> int:
+    """Imports the videos of the old videos.json ledger.
+
+    Returns:
+        int: The number of imported videos
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as done_vids_raw:
+            done_videos = json.load(done_vids_raw)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return 0
+    with connection:
+        connection.executemany(
+            "INSERT OR IGNORE INTO videos VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    str(video["id"]),
+                    video.get("subreddit", ""),
+                    int(video.get("time") or 0),
+                    video.get("reddit_title", ""),
+                    video.get("filename", ""),
+                    video.get("background_credit", ""),
+                )
+                for video in done_videos
+            ],
+        )
+    return len(done_videos)
+
+
+def is_done(reddit_id: str) -> bool:
+    """Checks if a video was already made (or skipped) for the given post."""
+    row = connect().execute("SELECT 1 FROM videos WHERE id = ?", (str(reddit_id),)).fetchone()
+    return row is not None
+
+
+def add_video(
+    subreddit: str, filename: str, reddit_title: str, reddit_id: str, credit: str, time: int
+) -> bool:
+    """Records a finished video. Returns False if the post was already in the ledger."""
+    connection = connect()
+    with connection:
+        cursor = connection.execute(
+            "INSERT OR IGNORE INTO videos VALUES (?, ?, ?, ?, ?, ?)",
+            (reddit_id, subreddit, time, reddit_title, filename, credit),
+        )
+    if cursor.rowcount:
+        export_json()
+    return bool(cursor.rowcount)
+
+
+def get_videos() -> List[Dict]:
+    """Returns every video in the ledger in the format of the old videos.json."""
+    rows = connect().execute("SELECT * FROM videos ORDER BY time, rowid").fetchall()
+    return [
+        {
+            "subreddit": row["subreddit"],
+            "id": row["id"],
+            "time": str(row["time"]),
+            "background_credit": row["background_credit"],
+            "reddit_title": row["reddit_title"],
+            "filename": row["filename"],
+        }
+        for row in rows
+    ]
+
+
+def export_json(path: str = JSON_EXPORT_PATH):
+    """Writes the ledger to videos.json, atomically so readers never see a half written file."""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as raw_vids:
+        json.dump(get_videos(), raw_vids, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, path)
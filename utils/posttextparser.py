@@ -1,35 +1,116 @@
-import os
+import argparse
+import importlib
 import re
+import threading
 import time
-from typing import List
+from pathlib import Path
+from typing import Iterable, List
 
 import spacy
 
-from utils.console import print_step
+from utils import settings
+from utils.console import print_step, print_substep, print_table
 from utils.voice import sanitize_text
 
+MODEL_NAME = "en_core_web_sm"
+# Only the parser sets the sentence boundaries, the other components are never used
+UNUSED_COMPONENTS = ["tagger", "attribute_ruler", "lemmatizer", "ner"]
+SPLITTERS = ("parser", "sentencizer")
 
-# working good
-def posttextparser(obj, *, tried: bool = False) -> List[str]:
-    text: str = re.sub("\n", " ", obj)
+_lock = threading.Lock()
+_pipelines = {}
+
+
+def load_parser():
+    """Loads en_core_web_sm without the unused components, downloading it if it's missing."""
     try:
-        nlp = spacy.load("en_core_web_sm")
-    except OSError as e:
-        if not tried:
-            os.system("python -m spacy download en_core_web_sm")
-            time.sleep(5)
-            return posttextparser(obj, tried=True)
-        print_step(
-            "The spacy model can't load. You need to install it with the command \npython -m spacy download en_core_web_sm "
-        )
-        raise e
+        return spacy.load(MODEL_NAME, exclude=UNUSED_COMPONENTS)
+    except OSError:
+        print_substep(f"Downloading the spacy model {MODEL_NAME}...")
+        try:
+            spacy.cli.download(MODEL_NAME)
+            importlib.invalidate_caches()  # so the freshly installed package can be imported
+            return spacy.load(MODEL_NAME, exclude=UNUSED_COMPONENTS)
+        except (OSError, SystemExit):
+            print_step(
+                "The spacy model can't load. You need to install it with the command \npython -m spacy download en_core_web_sm "
+            )
+            print_substep("Splitting the sentences with rules instead.", "bold red")
+            return None
+
+
+def get_pipeline(splitter: str = None):
+    """Returns the sentence splitting pipeline, loaded once per process.
+
+    Args:
+        splitter (str, optional): parser (accurate, needs en_core_web_sm) or sentencizer (rule
+            based, much faster and needs no model). Defaults to settings.storymode_sentence_splitter.
+    """
+    splitter = (
+        splitter or settings.get_config()["settings"]["storymode_sentence_splitter"] or "parser"
+    )
+    with _lock:
+        if splitter not in _pipelines:
+            nlp = load_parser() if splitter == "parser" else None
+            if nlp is None:
+                nlp = spacy.blank("en")
+                nlp.add_pipe("sentencizer")
+            _pipelines[splitter] = nlp
+        return _pipelines[splitter]
+
 
-    doc = nlp(text)
+def split_sentences(
+    texts: Iterable[str], splitter: str = None, batch_size: int = 32
+) -> List[List[str]]:
+    """Splits every text into its sentences, processing the texts in batches.
+
+    Returns:
+        List[List[str]]: The sentences of every text, without the ones that are empty once sanitized
+    """
+    nlp = get_pipeline(splitter)
+    texts = [re.sub("\n", " ", text) for text in texts]
+    return [
+        [sentence.text for sentence in doc.sents if sanitize_text(sentence.text)]
+        for doc in nlp.pipe(texts, batch_size=batch_size)
+    ]
+
+
+# working good
+def posttextparser(obj) -> List[str]:
+    return split_sentences([obj])[0]
+
+
+def benchmark(texts: List[str], splitters: List[str]) -> List[str]:
+    """Measures the load time and throughput of the sentence splitters.
+
+    Returns:
+        List[str]: One line of results per splitter
+    """
+    results = []
+    characters = sum(len(text) for text in texts)
+    for splitter in splitters:
+        start = time.perf_counter()
+        get_pipeline(splitter)
+        load_time = time.perf_counter() - start
+        start = time.perf_counter()
+        sentences = sum(len(doc) for doc in split_sentences(texts, splitter))
+        run_time = time.perf_counter() - start
+        results.append(
+            f"{splitter}: load {load_time:.2f}s, {len(texts) / run_time:.0f} posts/s, "
+            f"{characters / run_time:.0f} characters/s, {sentences} sentences"
+        )
+    return results
 
-    newtext: list = []
 
-    for line in doc.sents:
-        if sanitize_text(line.text):
-            newtext.append(line.text)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the story mode sentence splitters")
+    parser.add_argument("file", help="Text file with one post per paragraph")
+    parser.add_argument("--splitters", nargs="*", choices=SPLITTERS, default=list(SPLITTERS))
+    args = parser.parse_args()
 
-    return newtext
+    directory = Path().absolute()
+    settings.check_toml(f"{directory}/utils/.config.template.toml", f"{directory}/config.toml")
+    with open(args.file, "r", encoding="utf-8") as posts_file:
+        posts = [post for post in posts_file.read().split("\n\n") if post.strip()]
+    print_step("Benchmarking the sentence splitters 🏁")
+    print_table(benchmark(posts, args.splitters))
@@ -0,0 +1,169 @@
+import argparse
+import random
+import time
+from types import SimpleNamespace
+from typing import List
+
+import torch
+import torch.nn.functional as F
+
+from utils.ai_methods import (
+    BACKENDS,
+    embed,
+    get_embeddings,
+    get_model,
+    mean_pooling,
+    thread_key,
+    thread_text,
+)
+from utils.console import print_step, print_substep, print_table
+
+
+def score(threads_embeddings: torch.Tensor, keywords_embeddings: torch.Tensor) -> torch.Tensor:
+    """Returns the summed cosine similarity of every thread to every keyword.
+
+    Both sides are normalized once, so all scores come from a single matrix product.
+    """
+    threads = F.normalize(threads_embeddings, dim=1)
+    keywords = F.normalize(keywords_embeddings, dim=1)
+    return (threads @ keywords.T).sum(dim=1)
+
+
+def sort_by_similarity(thread_objects, keywords: List[str], k: int = None):
+    """Sorts the threads by their total similarity with the given keywords.
+
+    Args:
+        thread_objects: Threads with id, title and selftext, e.g. from utils.candidate_pool
+        keywords (List[str]): Keywords or sentences to compare the threads with
+        k (int, optional): Only return the k most similar threads. Defaults to all of them.
+
+    Returns:
+        Tuple[list, torch.Tensor]: The threads and their scores, most similar first
+    """
+    thread_objects = list(thread_objects)
+    if not thread_objects:
+        return [], torch.zeros(0)
+
+    threads_embeddings = get_embeddings(
+        [thread_key(thread) for thread in thread_objects],
+        [thread_text(thread) for thread in thread_objects],
+    )
+    keywords_embeddings = get_embeddings([f"keyword:{keyword}" for keyword in keywords], keywords)
+
+    scores = score(threads_embeddings, keywords_embeddings)
+    similarity_scores, indices = torch.topk(scores, min(k or len(thread_objects), len(scores)))
+    return [thread_objects[index] for index in indices.tolist()], similarity_scores
+
+
+def legacy_embed(texts: List[str]) -> torch.Tensor:
+    """Encodes every text in one padded batch, the way the threads were embedded before."""
+    tokenizer, model = get_model("torch")
+    encoded = tokenizer(texts, padding=True, truncation=True, return_tensors="pt")
+    with torch.no_grad():
+        output = model(**encoded)
+    return mean_pooling(output, encoded["attention_mask"])
+
+
+def make_threads(count: int) -> List[SimpleNamespace]:
+    """Fake threads with titles and texts of realistic, varied lengths."""
+    words = "the a reddit post story what why how people life work friend time money cat".split()
+    rng = random.Random(0)
+    return [
+        SimpleNamespace(
+            id=f"bench{index}",
+            title=" ".join(rng.choices(words, k=rng.randint(5, 25))),
+            selftext=" ".join(rng.choices(words, k=rng.choice([0, 0, 20, 80, 300]))),
+        )
+        for index in range(count)
+    ]
+
+
+def benchmark(sizes: List[int], keywords: List[str], legacy_max: int = 1000) -> List[str]:
+    """Embeds and ranks fake threads with the torch backend, without the embedding cache.
+
+    Returns:
+        List[str]: One line of results per size
+    """
+    import resource  # Unix only, like the peak memory it reports
+
+    results = []
+    keywords_embeddings = embed(keywords, backend="torch")
+    for size in sizes:
+        print_substep(f"Ranking {size} threads...")
+        texts = [thread_text(thread) for thread in make_threads(size)]
+        start = time.perf_counter()
+        threads_embeddings = embed(texts, backend="torch")
+        encode_time = time.perf_counter() - start
+        start = time.perf_counter()
+        torch.topk(score(threads_embeddings, keywords_embeddings), min(50, size))
+        score_time = time.perf_counter() - start
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        results.append(
+            f"{size} threads: encode {encode_time:.2f}s ({size / encode_time:.0f} threads/s), "
+            f"score and top 50 {score_time * 1000:.1f}ms, peak RSS {peak_mb:.0f} MB"
+        )
+    # Measured last so its memory doesn't show up in the peaks above. A single padded batch of
+    # thousands of threads takes gigabytes, so it's only measured for the smaller sizes.
+    for position, size in enumerate(sizes):
+        if size <= legacy_max:
+            texts = [thread_text(thread) for thread in make_threads(size)]
+            start = time.perf_counter()
+            legacy_embed(texts)
+            results[position] += f", single batch encode {time.perf_counter() - start:.2f}s"
+    return results
+
+
+def compare_backends(backends: List[str], size: int, keywords: List[str], k: int = 50) -> List[str]:
+    """Compares the latency and accuracy of the model backends with the torch backend.
+
+    Accuracy is the mean cosine similarity of the embeddings to the torch ones and how many of
+    the k best threads of the torch ranking a backend ranks in its own k best.
+
+    Returns:
+        List[str]: One line of results per backend
+    """
+    texts = [thread_text(thread) for thread in make_threads(size)]
+    k = min(k, size)
+    results = []
+    reference = None
+    for backend in ["torch"] + [backend for backend in backends if backend != "torch"]:
+        print_substep(f"Embedding {size} threads with the {backend} backend...")
+        start = time.perf_counter()
+        get_model(backend)
+        load_time = time.perf_counter() - start
+        start = time.perf_counter()
+        threads_embeddings = embed(texts, backend=backend)
+        encode_time = time.perf_counter() - start
+        top_k = set(
+            torch.topk(score(threads_embeddings, embed(keywords, backend=backend)), k)[1].tolist()
+        )
+        if reference is None:
+            reference = (threads_embeddings, top_k)
+        cosine = F.cosine_similarity(threads_embeddings, reference[0]).mean().item()
+        results.append(
+            f"{backend}: load {load_time:.2f}s, encode {encode_time:.2f}s "
+            f"({size / encode_time:.0f} threads/s), cosine to torch {cosine:.4f}, "
+            f"top {k} overlap {len(top_k & reference[1]) / k:.0%}"
+        )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the similarity ranking")
+    parser.add_argument("sizes", nargs="*", type=int, default=[100, 1000, 10000])
+    parser.add_argument("--keywords", default="Elon Musk, Twitter, Stocks")
+    parser.add_argument(
+        "--backends",
+        nargs="*",
+        choices=BACKENDS,
+        help="Compare the latency and accuracy of these model backends instead",
+    )
+    args = parser.parse_args()
+    keywords = [keyword.strip() for keyword in args.keywords.split(",")]
+
+    if args.backends is not None:
+        print_step("Comparing the model backends 🏁")
+        print_table(compare_backends(args.backends or list(BACKENDS), args.sizes[0], keywords))
+    else:
+        print_step("Benchmarking the similarity ranking 🏁")
+        print_table(benchmark(args.sizes, keywords))
@@ -1,6 +1,9 @@
 import re
+from contextlib import contextmanager
+from contextvars import ContextVar
 from pathlib import Path
-from typing import Dict, Tuple
+from types import MappingProxyType
+from typing import Dict, Iterator, Mapping, Optional, Tuple
 
 import toml
 from rich.console import Console
@@ -165,6 +168,65 @@ If you see any prompts, that means that you have unset/incorrectly set variables
     return config
 
 
+def freeze(value):
+    """Returns a read-only copy of a config (section), so a job can't change the config of another."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def merge(base: Mapping, overrides: Mapping, path: str = "") -> dict:
+    """Returns a copy of base with the values of overrides, which may only set existing keys."""
+    merged = {
+        key: dict(value) if isinstance(value, Mapping) else value for key, value in base.items()
+    }
+    for key, value in overrides.items():
+        if key not in base:
+            raise ValueError(f"Unknown config key {path}{key}")
+        if isinstance(base[key], Mapping):
+            if not isinstance(value, Mapping):
+                raise ValueError(f"{path}{key} is a section of the config, not a value")
+            merged[key] = merge(base[key], value, f"{path}{key}.")
+        else:
+            merged[key] = value
+    return merged
+
+
+class JobContext:
+    """The settings a job runs with: a frozen snapshot of the config, taken when the job is made.
+
+    Several jobs with different settings can run in one process, every stage reads the config of
+    its own job with get_config().
+
+    Args:
+        overrides (Mapping, optional): Values that differ from the config, e.g.
+            {"settings": {"theme": "light"}}
+    """
+
+    def __init__(self, overrides: Optional[Mapping] = None):
+        self.config = freeze(merge(config, overrides or {}))
+
+    @contextmanager
+    def activate(self) -> Iterator["JobContext"]:
+        """Makes this the context of the running job until the block exits."""
+        token = _job_context.set(self)
+        try:
+            yield self
+        finally:
+            _job_context.reset(token)
+
+
+_job_context: ContextVar[Optional[JobContext]] = ContextVar("job_context", default=None)
+
+
+def get_config() -> Mapping:
+    """Returns the config of the running job, or the global config outside of a job."""
+    context = _job_context.get()
+    return config if context is None else context.config
+
+
 if __name__ == "__main__":
     directory = Path().absolute()
     check_toml(f"{directory}/utils/.config.template.toml", "config.toml")
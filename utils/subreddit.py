@@ -1,40 +1,35 @@
-import json
-from os.path import exists
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional
 
-from utils import settings
-from utils.ai_methods import sort_by_similarity
+from utils import candidate_pool, ledger, settings
 from utils.console import print_substep
 
+# Posts picked by a job of this process that isn't done yet, so concurrent jobs pick different ones
+_in_progress = set()
+_in_progress_lock = threading.Lock()
+# The posts picked by the running job, see picked_posts
+_picked: ContextVar[Optional[List[str]]] = ContextVar("picked_posts", default=None)
 
-def get_subreddit_undone(submissions: list, subreddit, times_checked=0, similarity_scores=None):
-    """_summary_
+
+def get_subreddit_undone(submissions, subreddit, similarity_scores=None):
+    """Returns the first post that has not been done and fits the config
 
     Args:
-        submissions (list): List of posts that are going to potentially be generated into a video
+        submissions (Iterable): Posts from utils.candidate_pool that could be made into a video
         subreddit (praw.Reddit.SubredditHelper): Chosen subreddit
+        similarity_scores (optional): Similarity scores of the submissions, returned with the post
 
     Returns:
-        Any: The submission that has not been done
+        Any: The submission that has not been done, or None if every post has been done
     """
-    # Second try of getting a valid Submission
-    if times_checked and settings.config["ai"]["ai_similarity_enabled"]:
-        print("Sorting based on similarity for a different date filter and thread limit..")
-        submissions = sort_by_similarity(
-            submissions, keywords=settings.config["ai"]["ai_similarity_enabled"]
-        )
-
-    # recursively checks if the top submission in the list was already done.
-    if not exists("./video_creation/data/videos.json"):
-        with open("./video_creation/data/videos.json", "w+") as f:
-            json.dump([], f)
-    with open("./video_creation/data/videos.json", "r", encoding="utf-8") as done_vids_raw:
-        done_videos = json.load(done_vids_raw)
     for i, submission in enumerate(submissions):
-        if already_done(done_videos, submission):
+        if already_done(submission.id):
             continue
         if submission.over_18:
             try:
-                if not settings.config["settings"]["allow_nsfw"]:
+                if not settings.get_config()["settings"]["allow_nsfw"]:
                     print_substep("NSFW Post Detected. Skipping...")
                     continue
             except AttributeError:
@@ -43,68 +38,72 @@ def get_subreddit_undone(submissions: list, subreddit, times_checked=0, similari
             print_substep("This post was pinned by moderators. Skipping...")
             continue
         if (
-            submission.num_comments <= int(settings.config["reddit"]["thread"]["min_comments"])
-            and not settings.config["settings"]["storymode"]
+            submission.num_comments <= int(settings.get_config()["reddit"]["thread"]["min_comments"])
+            and not settings.get_config()["settings"]["storymode"]
         ):
             print_substep(
-                f'This post has under the specified minimum of comments ({settings.config["reddit"]["thread"]["min_comments"]}). Skipping...'
+                f'This post has under the specified minimum of comments ({settings.get_config()["reddit"]["thread"]["min_comments"]}). Skipping...'
             )
             continue
-        if settings.config["settings"]["storymode"]:
+        if settings.get_config()["settings"]["storymode"]:
             if not submission.selftext:
                 print_substep("You are trying to use story mode on post with no post text")
                 continue
             else:
                 # Check for the length of the post text
                 if len(submission.selftext) > (
-                    settings.config["settings"]["storymode_max_length"] or 2000
+                    settings.get_config()["settings"]["storymode_max_length"] or 2000
                 ):
                     print_substep(
-                        f"Post is too long ({len(submission.selftext)}), try with a different post. ({settings.config['settings']['storymode_max_length']} character limit)"
+                        f"Post is too long ({len(submission.selftext)}), try with a different post. ({settings.get_config()['settings']['storymode_max_length']} character limit)"
                     )
                     continue
                 elif len(submission.selftext) < 30:
                     continue
-        if settings.config["settings"]["storymode"] and not submission.is_self:
+        if settings.get_config()["settings"]["storymode"] and not submission.is_self:
             continue
+        with _in_progress_lock:
+            if str(submission.id) in _in_progress:
+                continue
+            _in_progress.add(str(submission.id))
+        if _picked.get() is not None:
+            _picked.get().append(str(submission.id))
+        submission = candidate_pool.to_submission(subreddit, submission)
         if similarity_scores is not None:
             return submission, similarity_scores[i].item()
         return submission
-    print("all submissions have been done going by top submission order")
-    VALID_TIME_FILTERS = [
-        "day",
-        "hour",
-        "month",
-        "week",
-        "year",
-        "all",
-    ]  # set doesn't have __getitem__
-    index = times_checked + 1
-    if index == len(VALID_TIME_FILTERS):
-        print("All submissions have been done.")
-
-    return get_subreddit_undone(
-        subreddit.top(
-            time_filter=VALID_TIME_FILTERS[index],
-            limit=(50 if int(index) == 0 else index + 1 * 50),
-        ),
-        subreddit,
-        times_checked=index,
-    )  # all the videos in hot have already been done
+    if similarity_scores is not None:
+        print("all sorted submissions have been done, going by listing order")
+        return get_subreddit_undone(candidate_pool.candidates(subreddit), subreddit), 0
+    print("All submissions have been done.")
+    return None
 
 
-def already_done(done_videos: list, submission) -> bool:
-    """Checks to see if the given submission is in the list of videos
+def already_done(reddit_id: str) -> bool:
+    """Checks to see if the given submission is in the ledger of finished videos
 
     Args:
-        done_videos (list): Finished videos
-        submission (Any): The submission
+        reddit_id (str): Id of the submission
 
     Returns:
-        Boolean: Whether the video was found in the list
+        Boolean: Whether the video was found in the ledger
     """
+    return ledger.is_done(str(reddit_id))
+
+
+def release(reddit_id: str):
+    """Lets other jobs pick a post again, once the job that picked it ended."""
+    with _in_progress_lock:
+        _in_progress.discard(str(reddit_id))
+
 
-    for video in done_videos:
-        if video["id"] == str(submission):
-            return True
-    return False
+@contextmanager
+def picked_posts() -> Iterator[List[str]]:
+    """Collects the posts picked inside the block, so the job can release them however it ends,
+    including when it fails right after picking one."""
+    picked = []
+    token = _picked.set(picked)
+    try:
+        yield picked
+    finally:
+        _picked.reset(token)
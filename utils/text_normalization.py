@@ -0,0 +1,147 @@
+import argparse
+import random
+import re
+import time
+from functools import lru_cache
+from typing import List
+
+from cleantext import clean
+
+from utils.console import print_step, print_substep, print_table
+
+# The lookbehind only lets a url start where the previous character can't be part of one. It
+# doesn't change the matches (a url that starts after such a character would have matched from
+# that character already) but skips the expensive attempts inside every word.
+URL_PATTERN = r"(?<![a-zA-Z0-9\.\/\?\:@\-_=#])(?:(?:http|https)\:\/\/)?[a-zA-Z0-9\.\/\?\:@\-_=#]+\.(?:[a-zA-Z]){2,6}(?:[a-zA-Z0-9\.\&\/\?\:@\-_=#])*"
+# note: not removing apostrophes, only those at the start or end of a word
+SPECIAL_CHARACTERS = '^_~@!&;#:-%—“”‘"*/{}[]()\\|<>=+'
+
+_URL = re.compile(URL_PATTERN)
+_APOSTROPHES = re.compile(r"\s['|’]|['|’]\s")
+# The special characters are replaced by a translation table, much cheaper than a regex
+_SPECIAL = str.maketrans(dict.fromkeys(SPECIAL_CHARACTERS, " "))
+# Everything add_periods replaces before the period fixes, in one pass
+_PERIODS = re.compile(rf"(?P<url>{URL_PATTERN})|(?P<newline>\n)|\b(?P<word>AI|AGI)\b")
+_PERIODS_REPLACEMENTS = {"url": " ", "newline": ". "}
+_ACRONYMS = {"AI": "A.I", "AGI": "A.G.I"}
+_QUOTE_PERIOD = re.compile(r'\."\.')
+
+
+@lru_cache(maxsize=8192)
+def sanitize(text: str, no_emojis: bool = False) -> str:
+    r"""Sanitizes the text for tts, memoized as the same comment is sanitized by several stages.
+        What gets removed:
+     - following characters`^_~@!&;#:-%“”‘"%*/{}[]()\|<>?=+`
+     - any http or https links
+
+    Args:
+        text (str): Text to be sanitized
+        no_emojis (bool): Also remove the emojis
+
+    Returns:
+        str: Sanitized text
+    """
+    # every url has a period, most comments don't
+    result = _URL.sub(" ", text) if "." in text else text
+    # the apostrophes are matched after the urls are gone, as that can put them next to a space
+    result = _APOSTROPHES.sub(" ", result).translate(_SPECIAL)
+    if no_emojis:
+        result = clean(result, no_emoji=True)
+    # remove extra whitespace
+    return " ".join(result.split())
+
+
+def _replace_periods(match: re.Match) -> str:
+    if match.lastgroup == "word":
+        return _ACRONYMS[match["word"]]
+    return _PERIODS_REPLACEMENTS[match.lastgroup]
+
+
+def add_periods(text: str) -> str:
+    """Removes links and adds periods to the end of paragraphs (where people often forget to put
+    them) so tts doesn't blend sentences."""
+    text = _PERIODS.sub(_replace_periods, text)
+    if text[-1] != ".":
+        text += "."
+    text = text.replace(". . .", ".").replace(".. . ", ".").replace(". . ", ".")
+    return _QUOTE_PERIOD.sub('".', text)
+
+
+def legacy_sanitize(text: str) -> str:
+    """sanitize_text as it was before this module, kept for the benchmark."""
+    regex_urls = r"((http|https)\:\/\/)?[a-zA-Z0-9\.\/\?\:@\-_=#]+\.([a-zA-Z]){2,6}([a-zA-Z0-9\.\&\/\?\:@\-_=#])*"
+    result = re.sub(regex_urls, " ", text)
+    regex_expr = r"\s['|’]|['|’]\s|[\^_~@!&;#:\-%—“”‘\"%\*/{}\[\]\(\)\\|<>=+]"
+    result = re.sub(regex_expr, " ", result)
+    result = result.replace("+", "plus").replace("&", "and")
+    return " ".join(result.split())
+
+
+def legacy_add_periods(text: str) -> str:
+    """TTSEngine.add_periods as it was before this module, kept for the benchmark."""
+    regex_urls = r"((http|https)\:\/\/)?[a-zA-Z0-9\.\/\?\:@\-_=#]+\.([a-zA-Z]){2,6}([a-zA-Z0-9\.\&\/\?\:@\-_=#])*"
+    text = re.sub(regex_urls, " ", text)
+    text = text.replace("\n", ". ")
+    text = re.sub(r"\bAI\b", "A.I", text)
+    text = re.sub(r"\bAGI\b", "A.G.I", text)
+    if text[-1] != ".":
+        text += "."
+    text = text.replace(". . .", ".")
+    text = text.replace(".. . ", ".")
+    text = text.replace(". . ", ".")
+    return re.sub(r'\."\.', '".', text)
+
+
+def make_corpus(count: int) -> List[str]:
+    """Fake comments with links, punctuation, acronyms, quotes and paragraphs."""
+    words = (
+        "I think the AI thing is (mostly) overhyped; see https://example.com/a?b=1 & "
+        "www.reddit.com/r/AskReddit - it's \"fine\" but AGI #soon isn't... 100% sure :) "
+        "my friend's cat won't eat, any ideas?"
+    ).split(" ")
+    rng = random.Random(0)
+    return [
+        "\n".join(
+            " ".join(rng.choices(words, k=rng.randint(5, 60))) for _ in range(rng.randint(1, 4))
+        )
+        for _ in range(count)
+    ]
+
+
+def benchmark(count: int) -> List[str]:
+    """Normalizes a fake corpus the legacy way and with this module, the way the pipeline does it:
+    the comment is sanitized to filter it, gets its periods, then is sanitized for the tts.
+
+    Returns:
+        List[str]: The timings and how many results differ from the legacy ones
+    """
+    corpus = make_corpus(count)
+
+    start = time.perf_counter()
+    legacy = [legacy_sanitize(legacy_add_periods(text)) for text in corpus if legacy_sanitize(text)]
+    legacy_time = time.perf_counter() - start
+
+    sanitize.cache_clear()
+    start = time.perf_counter()
+    results = [sanitize(add_periods(text)) for text in corpus if sanitize(text)]
+    new_time = time.perf_counter() - start
+
+    different = sum(old != new for old, new in zip(legacy, results)) + abs(
+        len(legacy) - len(results)
+    )
+    return [
+        f"legacy: {legacy_time:.2f}s ({count / legacy_time:.0f} comments/s)",
+        f"compiled: {new_time:.2f}s ({count / new_time:.0f} comments/s), "
+        f"{legacy_time / new_time:.1f}x faster",
+        f"{different} of {len(legacy)} results differ from the legacy ones",
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the text normalization")
+    parser.add_argument("--comments", type=int, default=100000, help="Size of the fake corpus")
+    args = parser.parse_args()
+
+    print_step("Benchmarking the text normalization 🏁")
+    print_substep(f"Normalizing {args.comments} comments...")
+    print_table(benchmark(args.comments))
@@ -1,13 +1,31 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
 import requests
 
 from utils.console import print_step
 
+VERSION_CACHE_PATH = "video_creation/data/latest_version.json"
+VERSION_CACHE_TTL = 24 * 60 * 60
+LATEST_RELEASE_URL = "https://api.github.com/repos/elebumm/RedditVideoMakerBot/releases/latest"
 
-def checkversion(__VERSION__: str):
-    response = requests.get(
-        "https://api.github.com/repos/elebumm/RedditVideoMakerBot/releases/latest"
-    )
+
+def fetch_latest_version(timeout: float = 3) -> str:
+    """Asks GitHub for the latest release and caches it in VERSION_CACHE_PATH."""
+    response = requests.get(LATEST_RELEASE_URL, timeout=timeout)
     latestversion = response.json()["tag_name"]
+    Path(VERSION_CACHE_PATH).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{VERSION_CACHE_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as cache_file:
+        json.dump({"version": latestversion, "time": time.time()}, cache_file)
+    os.replace(tmp_path, VERSION_CACHE_PATH)
+    return latestversion
+
+
+def print_version_status(__VERSION__: str, latestversion: str) -> bool:
     if __VERSION__ == latestversion:
         print_step(f"You are using the newest version ({__VERSION__}) of the bot")
         return True
@@ -19,3 +37,32 @@ def checkversion(__VERSION__: str):
         print_step(
             f"Welcome to the test version ({__VERSION__}) of the bot. Thanks for testing and feel free to report any bugs you find."
         )
+    return False
+
+
+def checkversion(__VERSION__: str):
+    """Tells the user whether a newer version of the bot is out, without waiting for GitHub.
+
+    The latest version is read from a cache that is refreshed in the background once a day. Without
+    a cache the status is printed once the background request answers.
+    """
+    try:
+        with open(VERSION_CACHE_PATH, "r", encoding="utf-8") as cache_file:
+            cache = json.load(cache_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        cache = None
+
+    if cache is not None:
+        print_version_status(__VERSION__, cache["version"])
+        if time.time() - cache["time"] < VERSION_CACHE_TTL:
+            return
+
+    def refresh():
+        try:
+            latestversion = fetch_latest_version()
+        except (requests.RequestException, KeyError, ValueError):
+            return  # offline or rate limited, the next run tries again
+        if cache is None:
+            print_version_status(__VERSION__, latestversion)
+
+    threading.Thread(target=refresh, name="version-check", daemon=True).start()
@@ -1,9 +1,8 @@
-import json
 import time
 
 from praw.models import Submission
 
-from utils import settings
+from utils import ledger, settings
 from utils.console import print_step
 
 
@@ -19,22 +18,21 @@ def check_done(
     Returns:
         Submission|None: Reddit object in args
     """
-    with open("./video_creation/data/videos.json", "r", encoding="utf-8") as done_vids_raw:
-        done_videos = json.load(done_vids_raw)
-    for video in done_videos:
-        if video["id"] == str(redditobj):
-            if settings.config["reddit"]["thread"]["post_id"]:
-                print_step(
-                    "You already have done this video but since it was declared specifically in the config file the program will continue"
-                )
-                return redditobj
-            print_step("Getting new post as the current one has already been done")
-            return None
+    if ledger.is_done(str(redditobj)):
+        if settings.get_config()["reddit"]["thread"]["post_id"]:
+            print_step(
+                "You already have done this video but since it was declared specifically in the config file the program will continue"
+            )
+            return redditobj
+        print_step("Getting new post as the current one has already been done")
+        return None
     return redditobj
 
 
 def save_data(subreddit: str, filename: str, reddit_title: str, reddit_id: str, credit: str):
-    """Saves the videos that have already been generated to a JSON file in video_creation/data/videos.json
+    """Saves the videos that have already been generated to the ledger in video_creation/data/videos.db
+
+    video_creation/data/videos.json is rewritten from the ledger for the GUI.
 
     Args:
         filename (str): The finished video title name
@@ -43,18 +41,5 @@ def save_data(subreddit: str, filename: str, reddit_title: str, reddit_id: str,
         @param reddit_id:
         @param reddit_title:
     """
-    with open("./video_creation/data/videos.json", "r+", encoding="utf-8") as raw_vids:
-        done_vids = json.load(raw_vids)
-        if reddit_id in [video["id"] for video in done_vids]:
-            return  # video already done but was specified to continue anyway in the config file
-        payload = {
-            "subreddit": subreddit,
-            "id": reddit_id,
-            "time": str(int(time.time())),
-            "background_credit": credit,
-            "reddit_title": reddit_title,
-            "filename": filename,
-        }
-        done_vids.append(payload)
-        raw_vids.seek(0)
-        json.dump(done_vids, raw_vids, ensure_ascii=False, indent=4)
+    # Ignored if the video was already done but was specified to continue anyway in the config file
+    ledger.add_video(subreddit, filename, reddit_title, reddit_id, credit, int(time.time()))
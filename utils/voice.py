@@ -1,13 +1,12 @@
-import re
 import sys
 import time as pytime
 from datetime import datetime
 from time import sleep
 
-from cleantext import clean
 from requests import Response
 
 from utils import settings
+from utils.text_normalization import sanitize
 
 if sys.version_info[0] >= 3:
     from datetime import timezone
@@ -77,20 +76,4 @@ def sanitize_text(text: str) -> str:
     Returns:
         str: Sanitized text
     """
-
-    # remove any urls from the text
-    regex_urls = r"((http|https)\:\/\/)?[a-zA-Z0-9\.\/\?\:@\-_=#]+\.([a-zA-Z]){2,6}([a-zA-Z0-9\.\&\/\?\:@\-_=#])*"
-
-    result = re.sub(regex_urls, " ", text)
-
-    # note: not removing apostrophes
-    regex_expr = r"\s['|’]|['|’]\s|[\^_~@!&;#:\-%—“”‘\"%\*/{}\[\]\(\)\\|<>=+]"
-    result = re.sub(regex_expr, " ", result)
-    result = result.replace("+", "plus").replace("&", "and")
-
-    # emoji removal if the setting is enabled
-    if settings.config["settings"]["tts"]["no_emojis"]:
-        result = clean(result, no_emoji=True)
-
-    # remove extra whitespace
-    return " ".join(result.split())
+    return sanitize(text, settings.get_config()["settings"]["tts"]["no_emojis"])
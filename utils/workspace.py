@@ -0,0 +1,200 @@
+import argparse
+import os
+import shutil
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import psutil
+
+from utils import settings
+from utils.console import print_step, print_substep, print_table
+
+DEFAULT_ROOT = "assets/temp"
+# Identifies the process using the workspace, a workspace without it is finished
+ACTIVE_NAME = ".active"
+# What every stage writes in the workspace, anything else is counted as "other"
+STAGE_OUTPUTS = {
+    "tts": ("mp3",),
+    "screenshots": ("png",),
+    "background": ("background.mp4",),
+    "render": ("segments", "thumbnail.png"),
+}
+
+_current: ContextVar[Optional["Workspace"]] = ContextVar("workspace", default=None)
+
+
+def get_root() -> str:
+    """The folder the workspaces are made in, e.g. /dev/shm/rvmb to keep them in RAM."""
+    return settings.get_config()["settings"]["temp_folder"] or DEFAULT_ROOT
+
+
+def get_quota() -> int:
+    """The most bytes all the workspaces may take together, 0 if there is no limit."""
+    return int(float(settings.get_config()["settings"]["temp_quota_gb"] or 0) * 1024**3)
+
+
+def _size(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    return sum(file.stat().st_size for file in path.rglob("*") if file.is_file())
+
+
+def _process_id() -> str:
+    """Identifies this process: its pid and start time, as pids get reused."""
+    process = psutil.Process()
+    return f"{process.pid} {process.create_time()}"
+
+
+def _process_alive(process_id: str) -> bool:
+    """Checks that the process identified by _process_id still runs, without signalling it."""
+    pid, _, create_time = process_id.partition(" ")
+    try:
+        return psutil.Process(int(pid)).create_time() == float(create_time)
+    except (psutil.NoSuchProcess, ValueError):
+        return False
+    except psutil.AccessDenied:
+        return True  # alive, but owned by someone else
+
+
+class Workspace:
+    """The folder a job writes its temporary files to, so two jobs never share one.
+
+    Args:
+        path (str): Folder of the workspace
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @classmethod
+    def create(cls, reddit_id: str) -> "Workspace":
+        """Makes a new workspace for a post, evicting old ones first if the quota is exceeded."""
+        evict(get_quota())
+        workspace = cls(f"{get_root()}/{reddit_id}-{uuid.uuid4().hex[:8]}")
+        Path(workspace.path).mkdir(parents=True, exist_ok=True)
+        return workspace
+
+    @contextmanager
+    def activate(self) -> Iterator["Workspace"]:
+        """Makes this the workspace of the running job until the block exits."""
+        active_path = Path(self.path, ACTIVE_NAME)
+        Path(self.path).mkdir(parents=True, exist_ok=True)
+        active_path.write_text(_process_id())
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+            active_path.unlink(missing_ok=True)
+            if Path(self.path).is_dir():
+                os.utime(self.path)  # the eviction goes by last use
+
+    def is_active(self) -> bool:
+        try:
+            process_id = Path(self.path, ACTIVE_NAME).read_text()
+        except FileNotFoundError:
+            return False
+        return _process_alive(process_id)
+
+    def size(self) -> int:
+        return _size(Path(self.path))
+
+    def usage(self) -> Dict[str, int]:
+        """Returns how many bytes every stage wrote in the workspace."""
+        usage = {}
+        other = self.size()
+        for stage, outputs in STAGE_OUTPUTS.items():
+            paths = [Path(self.path, output) for output in outputs]
+            usage[stage] = sum(_size(path) for path in paths if path.exists())
+            other -= usage[stage]
+        usage["other"] = other
+        return usage
+
+    def remove(self) -> int:
+        """Deletes the workspace.
+
+        Returns:
+            int: How many files were deleted
+        """
+        if not Path(self.path).is_dir():
+            return 0
+        count = sum(1 for file in Path(self.path).rglob("*") if file.is_file())
+        shutil.rmtree(self.path, ignore_errors=True)
+        return count
+
+
+def current() -> Optional[Workspace]:
+    return _current.get()
+
+
+def temp_dir(reddit_id: str) -> str:
+    """Returns the folder to write the temporary files of a post to: the workspace of the running
+    job, or the post's folder in the temp folder outside of a job."""
+    workspace = _current.get()
+    return workspace.path if workspace is not None else f"{get_root()}/{reddit_id}"
+
+
+def workspaces() -> List[Workspace]:
+    """Returns all the workspaces, least recently used first."""
+    root = Path(get_root())
+    if not root.is_dir():
+        return []
+    folders = sorted((path for path in root.iterdir() if path.is_dir()), key=os.path.getmtime)
+    return [Workspace(str(folder)) for folder in folders]
+
+
+def evict(quota: int) -> List[str]:
+    """Deletes the least recently used finished workspaces until they all fit in the quota.
+
+    Args:
+        quota (int): Bytes the workspaces may take, 0 for no limit
+
+    Returns:
+        List[str]: The deleted workspaces
+    """
+    if not quota:
+        return []
+    candidates = workspaces()
+    total = sum(workspace.size() for workspace in candidates)
+    evicted = []
+    for workspace in candidates:
+        if total <= quota:
+            break
+        if workspace.is_active():
+            continue
+        total -= workspace.size()
+        workspace.remove()
+        evicted.append(workspace.path)
+    if evicted:
+        print_substep(f"Evicted {len(evicted)} old workspaces to stay under the temp quota.")
+    if total > quota:
+        print_substep(
+            f"The running jobs take {total / 1024**2:.0f} MB, over the temp quota.", "bold red"
+        )
+    return evicted
+
+
+def print_usage(workspace: Workspace):
+    print_table(
+        f"{stage}: {size / 1024**2:.1f} MB" for stage, size in workspace.usage().items() if size
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show and clean up the job workspaces")
+    parser.add_argument("--evict", action="store_true", help="Apply the temp quota now")
+    args = parser.parse_args()
+
+    directory = Path().absolute()
+    settings.check_toml(f"{directory}/utils/.config.template.toml", f"{directory}/config.toml")
+    if args.evict:
+        evict(get_quota())
+
+    print_step(f"Workspaces in {get_root()} 📁")
+    for workspace in workspaces():
+        status = "running" if workspace.is_active() else "finished"
+        print_substep(f"{Path(workspace.path).name} ({status}, {workspace.size() / 1024**2:.1f} MB)")
+        print_usage(workspace)
@@ -1,18 +1,35 @@
+import argparse
 import json
+import os
 import random
 import re
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from pathlib import Path
 from random import randrange
 from typing import Any, Dict, Tuple
 
-import yt_dlp
-from moviepy.editor import AudioFileClip, VideoFileClip
-from moviepy.video.io.ffmpeg_tools import ffmpeg_extract_subclip
+import ffmpeg
+import requests
 
 from utils import settings
+from utils.background_index import file_checksum, get_media_info, snap_to_keyframe
 from utils.console import print_step, print_substep
+from utils.workspace import temp_dir
 
+NORMALIZED_FPS = 30
+CHECKSUMS_PATH = "assets/backgrounds/checksums.json"
 
+_checksums_lock = threading.Lock()
+# The running downloads by key, so a second caller waits for the first instead of downloading too
+_downloads: Dict[str, Future] = {}
+_downloads_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
 def load_background_options():
     background_options = {}
     # Load background videos
@@ -57,25 +74,167 @@ def get_start_and_end_times(video_length: int, length_of_clip: int) -> Tuple[int
     return random_time, random_time + video_length
 
 
+def cut_media(path: str, start: float, end: float, target: str):
+    """Copies the streams of path between start and end to target without decoding them.
+
+    Video cuts start at the keyframe before start.
+    """
+    ffmpeg.input(path, ss=start).output(
+        target, t=end - start, c="copy", avoid_negative_ts="make_zero"
+    ).overwrite_output().run(quiet=True)
+
+
 def get_background_config(mode: str):
     """Fetch the background/s configuration"""
     try:
-        choice = str(settings.config["settings"]["background"][f"background_{mode}"]).casefold()
+        choice = str(
+            settings.get_config()["settings"]["background"][f"background_{mode}"]
+        ).casefold()
     except AttributeError:
         print_substep("No background selected. Picking random background'")
         choice = None
 
     # Handle default / not supported background using default option.
     # Default : pick random from supported background.
+    background_options = load_background_options()
     if not choice or choice not in background_options[mode]:
         choice = random.choice(list(background_options[mode].keys()))
 
     return background_options[mode][choice]
 
 
+def load_checksums() -> Dict[str, str]:
+    """Returns the sha256 of every verified background, keyed by "video/<file>" or "audio/<file>"."""
+    try:
+        with open(CHECKSUMS_PATH, "r", encoding="utf-8") as checksums_file:
+            return json.load(checksums_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_checksum(key: str, checksum: str):
+    with _checksums_lock:
+        checksums = load_checksums()
+        checksums[key] = checksum
+        tmp_path = f"{CHECKSUMS_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as checksums_file:
+            json.dump(checksums, checksums_file, indent=4)
+        os.replace(tmp_path, CHECKSUMS_PATH)
+
+
+@lru_cache(maxsize=None)
+def load_mirror_checksums(mirror: str) -> Dict[str, str]:
+    response = requests.get(f"{mirror}/checksums.json", timeout=30)
+    response.raise_for_status()
+    return response.json()
+
+
+def download_from_mirror(mirror: str, key: str, part_path: str):
+    """Downloads a background from an HTTP mirror laid out like assets/backgrounds.
+
+    A partial download is resumed with a Range request when the server supports it.
+    """
+    resume_from = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {"Range": f"bytes={resume_from}-"} if resume_from else {}
+    with requests.get(f"{mirror}/{key}", headers=headers, stream=True, timeout=30) as response:
+        if response.status_code == 416:  # the part file is already complete
+            return
+        response.raise_for_status()
+        mode = "ab" if response.status_code == 206 else "wb"
+        with open(part_path, mode) as part_file:
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
+                part_file.write(chunk)
+
+
+def fetch_background(mode: str, background_config: Tuple, quiet: bool = False) -> str:
+    """Downloads a background to assets/backgrounds/<mode>/<credit>-<filename> if it isn't there yet.
+
+    The download is written next to the target, resumed if a previous one was interrupted,
+    verified against the checksum manifest and only then moved into place, so an existing
+    target is always complete. A caller asking for a background that is being downloaded waits
+    for that download and gets its file.
+
+    Args:
+        mode (str): "video" or "audio"
+        background_config (Tuple): The background config from background_<mode>s.json
+        quiet (bool): Hide the yt-dlp progress, used when downloading several files at once
+
+    Returns:
+        str: Path of the downloaded background
+    """
+    uri, filename, credit = background_config[:3]
+    key = f"{mode}/{credit}-{filename}"
+    target = f"assets/backgrounds/{key}"
+    if Path(target).is_file():
+        return target
+    with _downloads_lock:
+        if Path(target).is_file():  # finished while this caller waited for the lock
+            return target
+        download = _downloads.get(key)
+        running = download is not None
+        if not running:
+            download = _downloads[key] = Future()
+    if running:
+        print_substep(f"Waiting for the running download of {filename}")
+        return download.result()
+    try:
+        download.set_result(_download_background(mode, background_config, quiet))
+    except BaseException as e:
+        download.set_exception(e)
+        raise
+    finally:
+        with _downloads_lock:
+            del _downloads[key]
+    return target
+
+
+def _download_background(mode: str, background_config: Tuple, quiet: bool) -> str:
+    uri, filename, credit = background_config[:3]
+    key = f"{mode}/{credit}-{filename}"
+    target = f"assets/backgrounds/{key}"
+    Path(target).parent.mkdir(parents=True, exist_ok=True)
+    download_path = f"{target}.download"
+    mirror = str(settings.get_config()["settings"]["background"]["background_mirror"] or "").rstrip(
+        "/"
+    )
+
+    if mirror:
+        print_substep(f"Downloading {filename} from {mirror}")
+        expected = load_mirror_checksums(mirror).get(key)
+        download_from_mirror(mirror, key, download_path)
+    else:
+        print_substep(f"Downloading {filename} from {uri}")
+        expected = load_checksums().get(key)
+        ydl_opts = {
+            "outtmpl": download_path,
+            "retries": 10,
+            "continuedl": True,
+            "noprogress": quiet,
+            "quiet": quiet,
+        }
+        if mode == "video":
+            ydl_opts["format"] = "bestvideo[height<=1080][ext=mp4]"
+        else:
+            ydl_opts.update({"format": "bestaudio/best", "extract_audio": True})
+        import yt_dlp  # slow to import and only needed for downloads
+
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            ydl.download([uri])
+
+    checksum = file_checksum(download_path)
+    if expected and checksum != expected:
+        if mirror:
+            os.remove(download_path)
+            raise ValueError(f"Checksum mismatch for {key}, the download was removed")
+        # YouTube can serve a different encode of the same video
+        print_substep(f"{key} differs from the last download, updating its checksum.", "yellow")
+    save_checksum(key, checksum)
+    os.replace(download_path, target)
+    return target
+
+
 def download_background_video(background_config: Tuple[str, str, str, Any]):
     """Downloads the background/s video from YouTube."""
-    Path("./assets/backgrounds/video/").mkdir(parents=True, exist_ok=True)
     # note: make sure the file name doesn't include an - in it
     uri, filename, credit, _ = background_config
     if Path(f"assets/backgrounds/video/{credit}-{filename}").is_file():
@@ -84,21 +243,12 @@ def download_background_video(background_config: Tuple[str, str, str, Any]):
         "We need to download the backgrounds videos. they are fairly large but it's only done once. 😎"
     )
     print_substep("Downloading the backgrounds videos... please be patient 🙏 ")
-    print_substep(f"Downloading {filename} from {uri}")
-    ydl_opts = {
-        "format": "bestvideo[height<=1080][ext=mp4]",
-        "outtmpl": f"assets/backgrounds/video/{credit}-{filename}",
-        "retries": 10,
-    }
-
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        ydl.download(uri)
+    fetch_background("video", background_config)
     print_substep("Background video downloaded successfully! 🎉", style="bold green")
 
 
 def download_background_audio(background_config: Tuple[str, str, str]):
     """Downloads the background/s audio from YouTube."""
-    Path("./assets/backgrounds/audio/").mkdir(parents=True, exist_ok=True)
     # note: make sure the file name doesn't include an - in it
     uri, filename, credit = background_config
     if Path(f"assets/backgrounds/audio/{credit}-{filename}").is_file():
@@ -107,21 +257,47 @@ def download_background_audio(background_config: Tuple[str, str, str]):
         "We need to download the backgrounds audio. they are fairly large but it's only done once. 😎"
     )
     print_substep("Downloading the backgrounds audio... please be patient 🙏 ")
-    print_substep(f"Downloading {filename} from {uri}")
-    ydl_opts = {
-        "outtmpl": f"./assets/backgrounds/audio/{credit}-{filename}",
-        "format": "bestaudio/best",
-        "extract_audio": True,
-    }
+    fetch_background("audio", background_config)
+    print_substep("Background audio downloaded successfully! 🎉", style="bold green")
 
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        ydl.download([uri])
 
-    print_substep("Background audio downloaded successfully! 🎉", style="bold green")
+def prefetch_backgrounds(workers: int = 4) -> int:
+    """Downloads every background of both catalogs concurrently.
+
+    Returns:
+        int: The number of backgrounds that failed to download
+    """
+    jobs = [
+        (mode, background_config)
+        for mode, backgrounds in load_background_options().items()
+        for background_config in backgrounds.values()
+    ]
+    failed = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch") as executor:
+        futures = {
+            executor.submit(fetch_background, mode, background_config, True): background_config
+            for mode, background_config in jobs
+        }
+        for future in as_completed(futures):
+            try:
+                print_substep(f"{future.result()} is ready.")
+            except Exception as e:
+                failed += 1
+                print_substep(f"Failed to download {futures[future][1]}: {e}", "red")
+    return failed
+
+
+def prefetch_in_background(workers: int = 4) -> Future:
+    """Starts prefetch_backgrounds without waiting for it, e.g. to warm a worker before it takes jobs."""
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+    future = executor.submit(prefetch_backgrounds, workers)
+    executor.shutdown(wait=False)
+    return future
 
 
 def chop_background(background_config: Dict[str, Tuple], video_length: int, reddit_object: dict):
-    """Generates the background audio and footage to be used in the video and writes it to assets/temp/background.mp3 and assets/temp/background.mp4
+    """Generates the background footage to be used in the video and writes it to background.mp4 in the workspace
+    The spot of the background audio to use is stored in background_config["audio_cut"].
 
     Args:
         background_config (Dict[str,Tuple]]) : Current background configuration
@@ -129,40 +305,187 @@ def chop_background(background_config: Dict[str, Tuple], video_length: int, redd
     """
     id = re.sub(r"[^\w\s-]", "", reddit_object["thread_id"])
 
-    if settings.config["settings"]["background"][f"background_audio_volume"] == 0:
+    if settings.get_config()["settings"]["background"][f"background_audio_volume"] == 0:
         print_step("Volume was set to 0. Skipping background audio creation . . .")
     else:
         print_step("Finding a spot in the backgrounds audio to chop...✂️")
         audio_choice = f"{background_config['audio'][2]}-{background_config['audio'][1]}"
-        background_audio = AudioFileClip(f"assets/backgrounds/audio/{audio_choice}")
         start_time_audio, end_time_audio = get_start_and_end_times(
-            video_length, background_audio.duration
+            video_length, get_media_info(f"assets/backgrounds/audio/{audio_choice}")["duration"]
+        )
+        # The audio is trimmed and mixed in the final render, see merge_background_audio
+        background_config["audio_cut"] = (
+            f"assets/backgrounds/audio/{audio_choice}",
+            start_time_audio,
+            end_time_audio,
         )
-        background_audio = background_audio.subclip(start_time_audio, end_time_audio)
-        background_audio.write_audiofile(f"assets/temp/{id}/background.mp3")
 
     print_step("Finding a spot in the backgrounds video to chop...✂️")
     video_choice = f"{background_config['video'][2]}-{background_config['video'][1]}"
-    background_video = VideoFileClip(f"assets/backgrounds/video/{video_choice}")
-    start_time_video, end_time_video = get_start_and_end_times(
-        video_length, background_video.duration
-    )
+    video_path = f"assets/backgrounds/video/{video_choice}"
+    normalized_path = get_normalized_path(background_config["video"])
+    if Path(normalized_path).is_file() and variants_match_aspect():
+        # Already cropped with a short GOP, the final render won't need to crop it
+        print_substep("Using the prepared background from the library.")
+        video_path = normalized_path
+    video_info = get_media_info(video_path)
+    start_time_video, end_time_video = get_start_and_end_times(video_length, video_info["duration"])
+    # Start on a keyframe so the stream copy starts exactly where it should
+    start_time_video = snap_to_keyframe(start_time_video, video_info.get("keyframes", []))
+    end_time_video = start_time_video + video_length
     # Extract video subclip
     try:
-        ffmpeg_extract_subclip(
-            f"assets/backgrounds/video/{video_choice}",
+        cut_media(
+            video_path,
             start_time_video,
             end_time_video,
-            targetname=f"assets/temp/{id}/background.mp4",
+            f"{temp_dir(id)}/background.mp4",
         )
-    except (OSError, IOError):  # ffmpeg issue see #348
+    except (OSError, IOError, ffmpeg.Error):  # ffmpeg issue see #348
         print_substep("FFMPEG issue. Trying again...")
-        with VideoFileClip(f"assets/backgrounds/video/{video_choice}") as video:
+        from moviepy.editor import VideoFileClip
+
+        with VideoFileClip(video_path) as video:
             new = video.subclip(start_time_video, end_time_video)
-            new.write_videofile(f"assets/temp/{id}/background.mp4")
+            new.write_videofile(f"{temp_dir(id)}/background.mp4")
     print_substep("Background video chopped successfully!", style="bold green")
     return background_config["video"][2]
 
 
-# Create a tuple for downloads background (background_audio_options, background_video_options)
-background_options = load_background_options()
+def aspect_crop_size(src_w: int, src_h: int, W: int, H: int) -> Tuple[int, int]:
+    """Returns the largest even size with the W:H aspect ratio that fits in src_w x src_h."""
+    width = src_h * W // H // 2 * 2
+    if width <= src_w:
+        return width, src_h
+    return src_w, src_w * H // W // 2 * 2
+
+
+def variants_match_aspect() -> bool:
+    """Checks that every variant has the aspect ratio of the main video. The library copy is
+    cropped to that ratio, cropping it again for another one would leave a small, zoomed in part."""
+    from video_creation.final_video import parse_variants
+
+    W = int(settings.get_config()["settings"]["resolution_w"])
+    H = int(settings.get_config()["settings"]["resolution_h"])
+    return all(
+        variant["W"] * H == W * variant["H"]
+        for variant in parse_variants(settings.get_config()["settings"]["variants"])
+    )
+
+
+def get_normalized_path(background_config: Tuple[str, str, str, Any]) -> str:
+    """Returns where the library copy of a background video for the configured size is stored."""
+    _, filename, credit, _ = background_config
+    W = int(settings.get_config()["settings"]["resolution_w"])
+    H = int(settings.get_config()["settings"]["resolution_h"])
+    return f"assets/backgrounds/video/normalized/{W}x{H}/{credit}-{filename}"
+
+
+def normalize_background(background_config: Tuple[str, str, str, Any]) -> str:
+    """Transcodes a background video to the configured aspect ratio with a one second GOP.
+
+    The video keeps its height so the screenshots look the same as with the original, it is
+    scaled to the final size in the render. Every chop of the result is a keyframe aligned stream
+    copy that doesn't need to be cropped anymore.
+    """
+    _, filename, credit, _ = background_config
+    source = f"assets/backgrounds/video/{credit}-{filename}"
+    target = get_normalized_path(background_config)
+    W = int(settings.get_config()["settings"]["resolution_w"])
+    H = int(settings.get_config()["settings"]["resolution_h"])
+    info = get_media_info(source)
+    crop = aspect_crop_size(info["width"], info["height"], W, H)
+
+    Path(target).parent.mkdir(parents=True, exist_ok=True)
+    tmp_target = f"{target}.tmp.mp4"
+    ffmpeg.input(source).video.filter("crop", *crop).filter("fps", NORMALIZED_FPS).output(
+        tmp_target,
+        **{
+            "c:v": "libx264",
+            "preset": "medium",
+            "crf": 18,
+            "g": NORMALIZED_FPS,
+            "keyint_min": NORMALIZED_FPS,
+            "sc_threshold": 0,
+        },
+    ).overwrite_output().run(quiet=True)
+    os.replace(tmp_target, target)
+    return target
+
+
+def prepare_background_library(force: bool = False):
+    """Prepares a library copy of every downloaded background video, see normalize_background."""
+    for name, background_config in load_background_options()["video"].items():
+        _, filename, credit, _ = background_config
+        if not Path(f"assets/backgrounds/video/{credit}-{filename}").is_file():
+            print_substep(f"Skipping {name}, it isn't downloaded.")
+            continue
+        if Path(get_normalized_path(background_config)).is_file() and not force:
+            print_substep(f"{name} is already prepared.")
+            continue
+        print_substep(f"Preparing {name}...")
+        try:
+            normalize_background(background_config)
+        except ffmpeg.Error as e:
+            print_substep(f"Failed to prepare {name}: {e.stderr.decode('utf8')}", "red")
+    print_substep("Background library prepared! 🎉", style="bold green")
+
+
+def benchmark_audio_chop(path: str, length: int = 60):
+    """Compares chopping a background track with moviepy (decode + re-encode) and with a stream copy.
+
+    Run with python -m video_creation.background benchmark path/to/audio [length]
+    """
+    start, end = get_start_and_end_times(length, get_media_info(path)["duration"])
+    suffix = Path(path).suffix or ".mp3"
+
+    def moviepy_chop(target):
+        from moviepy.editor import AudioFileClip
+
+        with AudioFileClip(path) as background_audio:
+            background_audio.subclip(start, end).write_audiofile(target, logger=None)
+
+    def stream_copy_chop(target):
+        cut_media(path, start, end, target)
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, chop in (("moviepy", moviepy_chop), ("stream copy", stream_copy_chop)):
+            target = os.path.join(directory, name.replace(" ", "_") + suffix)
+            before, wall_start = os.times(), time.perf_counter()
+            chop(target)
+            after, wall_time = os.times(), time.perf_counter() - wall_start
+            cpu_time = sum(after[:4]) - sum(before[:4])  # includes the ffmpeg children
+            print_substep(
+                f"{name}: {wall_time:.2f}s wall, {cpu_time:.2f}s cpu, "
+                f"{os.path.getsize(target) / 1024:.0f} KiB"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Background library tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    prepare_parser = subparsers.add_parser(
+        "prepare", help="Prepare the backgrounds for the configured resolution"
+    )
+    prepare_parser.add_argument("--force", action="store_true", help="Prepare them again")
+    prefetch_parser = subparsers.add_parser("prefetch", help="Download every background")
+    prefetch_parser.add_argument("--workers", type=int, default=4)
+    benchmark_parser = subparsers.add_parser(
+        "benchmark", help="Compare the moviepy and the stream copy audio chop"
+    )
+    benchmark_parser.add_argument("audio")
+    benchmark_parser.add_argument("length", type=int, nargs="?", default=60)
+    args = parser.parse_args()
+
+    if args.command in ("prepare", "prefetch"):
+        directory = Path().absolute()
+        settings.check_toml(f"{directory}/utils/.config.template.toml", f"{directory}/config.toml")
+    if args.command == "prepare":
+        print_step("Preparing the background library 📚")
+        prepare_background_library(args.force)
+    elif args.command == "prefetch":
+        print_step("Downloading every background 📥")
+        exit(1 if prefetch_backgrounds(args.workers) else 0)
+    else:
+        print_step(f"Chopping {args.audio} with moviepy and with a stream copy ✂️")
+        benchmark_audio_chop(args.audio, args.length)
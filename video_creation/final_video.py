@@ -1,16 +1,13 @@
+import io
 import multiprocessing
 import os
 import re
-import tempfile
 import textwrap
-import threading
-import time
 from os.path import exists  # Needs to be imported specifically
 from pathlib import Path
-from typing import Dict, Final, Tuple
+from typing import Dict, Final, List, Tuple
 
 import ffmpeg
-import translators
 from PIL import Image, ImageDraw, ImageFont
 from rich.console import Console
 from rich.progress import track
@@ -18,52 +15,24 @@ from rich.progress import track
 from utils import settings
 from utils.cleanup import cleanup
 from utils.console import print_step, print_substep
+from utils.encoding_profiles import DEFAULT_PROFILE, get_encoding_profile
+from utils.ffmpeg_progress import (
+    MetricsSink,
+    ProgressSink,
+    TqdmSink,
+    TraceSink,
+    parse_progress,
+    run_ffmpeg,
+)
 from utils.fonts import getheight
 from utils.thumbnail import create_thumbnail
 from utils.videos import save_data
+from utils.workspace import temp_dir
+from video_creation.background import aspect_crop_size
 
 console = Console()
 
-
-class ProgressFfmpeg(threading.Thread):
-    def __init__(self, vid_duration_seconds, progress_update_callback):
-        threading.Thread.__init__(self, name="ProgressFfmpeg")
-        self.stop_event = threading.Event()
-        self.output_file = tempfile.NamedTemporaryFile(mode="w+", delete=False)
-        self.vid_duration_seconds = vid_duration_seconds
-        self.progress_update_callback = progress_update_callback
-
-    def run(self):
-        while not self.stop_event.is_set():
-            latest_progress = self.get_latest_ms_progress()
-            if latest_progress is not None:
-                completed_percent = latest_progress / self.vid_duration_seconds
-                self.progress_update_callback(completed_percent)
-            time.sleep(1)
-
-    def get_latest_ms_progress(self):
-        lines = self.output_file.readlines()
-
-        if lines:
-            for line in lines:
-                if "out_time_ms" in line:
-                    out_time_ms_str = line.split("=")[1].strip()
-                    if out_time_ms_str.isnumeric():
-                        return float(out_time_ms_str) / 1000000.0
-                    else:
-                        # Handle the case when "N/A" is encountered
-                        return None
-        return None
-
-    def stop(self):
-        self.stop_event.set()
-
-    def __enter__(self):
-        self.start()
-        return self
-
-    def __exit__(self, *args, **kwargs):
-        self.stop()
+DRAFT_FPS: Final[int] = 15
 
 
 def name_normalize(name: str) -> str:
@@ -74,38 +43,96 @@ def name_normalize(name: str) -> str:
     name = re.sub(r"(\w+)\s?\/\s?(\w+)", r"\1 or \2", name)
     name = re.sub(r"\/", r"", name)
 
-    lang = settings.config["reddit"]["thread"]["post_lang"]
+    lang = settings.get_config()["reddit"]["thread"]["post_lang"]
     if lang:
         print_substep("Translating filename...")
+        import translators  # slow to import, only needed to translate
+
         translated_name = translators.translate_text(name, translator="google", to_language=lang)
         return translated_name
     else:
         return name
 
 
-def prepare_background(reddit_id: str, W: int, H: int) -> str:
-    output_path = f"assets/temp/{reddit_id}/background_noaudio.mp4"
-    output = (
-        ffmpeg.input(f"assets/temp/{reddit_id}/background.mp4")
-        .filter("crop", f"ih*({W}/{H})", "ih")
-        .output(
-            output_path,
-            an=None,
-            **{
-                "c:v": "h264",
-                "b:v": "20M",
-                "b:a": "192k",
-                "threads": multiprocessing.cpu_count(),
-            },
+def parse_variants(spec: str) -> List[Dict]:
+    """Parses the variants setting, a comma separated list of WIDTHxHEIGHT[@BITRATE] entries.
+
+    Args:
+        spec (str): The variants setting, e.g. "1920x1080,1080x1080@8M"
+
+    Returns:
+        List[Dict]: Width, height and video bitrate (None uses the encoding profile) of every variant
+    """
+    variants = []
+    for item in str(spec or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        size, _, bitrate = item.partition("@")
+        match = re.fullmatch(r"(\d+)x(\d+)", size.strip())
+        if match is None:
+            print_substep(
+                f"Skipping the variant {item}, use the WIDTHxHEIGHT[@BITRATE] format.", "red"
+            )
+            continue
+        variants.append({"W": int(match[1]), "H": int(match[2]), "bitrate": bitrate.strip() or None})
+    return variants
+
+
+def split_stream(stream, count: int, filter_name: str = "split") -> list:
+    """Splits a stream so it can feed several outputs of the same ffmpeg process.
+
+    Args:
+        stream: The ffmpeg stream to split.
+        count (int): The number of copies needed.
+        filter_name (str): "split" for video streams, "asplit" for audio streams.
+    """
+    if count == 1:
+        return [stream]
+    node = ffmpeg.filter_multi_output(stream, filter_name, count)
+    return [node.stream(i) for i in range(count)]
+
+
+def crop_to_aspect(stream, src_w: int, src_h: int, W: int, H: int):
+    """Crops the center of a src_w x src_h stream to the W:H aspect ratio. No-op if it already matches."""
+    crop = aspect_crop_size(src_w, src_h, W, H)
+    if crop == (src_w, src_h):
+        return stream
+    return stream.filter("crop", *crop)
+
+
+def overlay_timeline(background_clip, timeline: List[Dict], W: int, H: int, credit: str):
+    """Overlays every screenshot of the timeline on the background and scales it to W x H.
+
+    Args:
+        background_clip: The (already cropped) background stream.
+        timeline (List[Dict]): The screenshots with the start, end and opacity they are shown with.
+        W (int): Width of the output.
+        H (int): Height of the output.
+        credit (str): The credit of the background video.
+    """
+    screenshot_width = int((W * 45) // 100)
+    for clip in timeline:
+        image_overlay = ffmpeg.input(clip["image"])["v"].filter("scale", screenshot_width, -1)
+        if clip["opacity"] is not None:
+            image_overlay = image_overlay.filter("colorchannelmixer", aa=clip["opacity"])
+        background_clip = background_clip.overlay(
+            image_overlay,
+            enable=f"between(t,{clip['start']},{clip['end']})",
+            x="(main_w-overlay_w)/2",
+            y="(main_h-overlay_h)/2",
         )
-        .overwrite_output()
+
+    background_clip = ffmpeg.drawtext(
+        background_clip,
+        text=f"Background by {credit}",
+        x=f"(w-text_w)",
+        y=f"(h-text_h)",
+        fontsize=5,
+        fontcolor="White",
+        fontfile=os.path.join("fonts", "Roboto-Regular.ttf"),
     )
-    try:
-        output.run(quiet=True)
-    except ffmpeg.Error as e:
-        print(e.stderr.decode("utf8"))
-        exit(1)
-    return output_path
+    return background_clip.filter("scale", W, H)
 
 
 def create_fancy_thumbnail(image, text, text_color, padding, wrap=35):
@@ -124,7 +151,7 @@ def create_fancy_thumbnail(image, text, text_color, padding, wrap=35):
     username_font = ImageFont.truetype(os.path.join("fonts", "Roboto-Bold.ttf"), 30)
     draw.text(
         (205, 825),
-        settings.config["settings"]["channel_name"],
+        settings.get_config()["settings"]["channel_name"],
         font=username_font,
         fill=text_color,
         align="left",
@@ -165,18 +192,21 @@ def create_fancy_thumbnail(image, text, text_color, padding, wrap=35):
     return image
 
 
-def merge_background_audio(audio: ffmpeg, reddit_id: str):
-    """Gather an audio and merge with assets/backgrounds/background.mp3
+def merge_background_audio(audio: ffmpeg, background_config: Dict[str, Tuple]):
+    """Gather an audio and merge with the spot of the background audio picked by chop_background
     Args:
         audio (ffmpeg): The TTS final audio but without background.
-        reddit_id (str): The ID of subreddit
+        background_config (Dict[str, Tuple]): The background config with the "audio_cut" to use.
     """
-    background_audio_volume = settings.config["settings"]["background"]["background_audio_volume"]
-    if background_audio_volume == 0:
+    background_audio_volume = settings.get_config()["settings"]["background"][
+        "background_audio_volume"
+    ]
+    if background_audio_volume == 0 or "audio_cut" not in background_config:
         return audio  # Return the original audio
     else:
-        # sets volume to config
-        bg_audio = ffmpeg.input(f"assets/temp/{reddit_id}/background.mp3").filter(
+        path, start, end = background_config["audio_cut"]
+        # trims the background audio and sets volume to config
+        bg_audio = ffmpeg.input(path, ss=start, t=end - start).audio.filter(
             "volume",
             background_audio_volume,
         )
@@ -185,13 +215,289 @@ def merge_background_audio(audio: ffmpeg, reddit_id: str):
         return merged_audio  # Return merged audio
 
 
+def compose_outputs(
+    background_clip,
+    background_size: Tuple[int, int],
+    timeline: List[Dict],
+    outputs: List[Dict],
+    paths: List[str],
+    credit: str,
+    profile: str,
+    audios: list = None,
+    threads: int = multiprocessing.cpu_count(),
+    duration: float = None,
+):
+    """Builds one ffmpeg output per entry of outputs, all fed by a single decode of background_clip.
+
+    Args:
+        background_clip: The background video stream.
+        background_size (Tuple[int, int]): Width and height of the background video.
+        timeline (List[Dict]): The screenshots to overlay, see make_final_video.
+        outputs (List[Dict]): Width, height, video bitrate and optionally fps of every output.
+        paths (List[str]): Where to save every output.
+        credit (str): The credit of the background video.
+        profile (str): Name of the encoding profile, see utils.encoding_profiles.
+        audios (list, optional): One audio stream per output. Outputs are silent if not given.
+        threads (int, optional): Encoder threads per output.
+        duration (float, optional): Only render this many seconds.
+    """
+    background_clips = split_stream(background_clip, len(outputs))
+    output_streams = list()
+    for i, output in enumerate(outputs):
+        clip = crop_to_aspect(background_clips[i], *background_size, output["W"], output["H"])
+        clip = overlay_timeline(clip, timeline, output["W"], output["H"], credit)
+        if output.get("fps"):
+            clip = clip.filter("fps", output["fps"])
+        streams = [clip] if audios is None else [clip, audios[i]]
+        output_args = get_encoding_profile(profile, output["bitrate"])
+        if output.get("fps"):
+            output_args["r"] = output["fps"]
+        if duration:
+            output_args["t"] = duration
+        output_streams.append(
+            ffmpeg.output(*streams, paths[i], f="mp4", **output_args, threads=threads)
+        )
+    return ffmpeg.merge_outputs(*output_streams)
+
+
+def segment_bounds(timeline: List[Dict], length: int, segments: int) -> List[Tuple[float, float]]:
+    """Splits the video at the clip boundaries closest to equal parts.
+
+    Args:
+        timeline (List[Dict]): The screenshots of the video, see make_final_video.
+        length (int): Length of the video
+        segments (int): The wanted number of segments. Less are returned for videos with few clips.
+
+    Returns:
+        List[Tuple[float, float]]: Start and end time of every segment
+    """
+    boundaries = sorted({clip["end"] for clip in timeline if 0 < clip["end"] < length})
+    cuts = list()
+    for n in range(1, segments):
+        if not boundaries:
+            break
+        cut = min(boundaries, key=lambda boundary: abs(boundary - length * n / segments))
+        boundaries.remove(cut)
+        cuts.append(cut)
+    cuts.sort()
+    return list(zip([0] + cuts, cuts + [length]))
+
+
+def render_segmented(
+    background_path: str,
+    background_size: Tuple[int, int],
+    timeline: List[Dict],
+    outputs: List[Dict],
+    final_audio,
+    credit: str,
+    profile: str,
+    length: int,
+    segments: int,
+    segment_dir: str,
+    sinks: List[ProgressSink],
+):
+    """Renders the video in parallel segments split at clip boundaries and joins them losslessly.
+
+    Every segment is encoded by its own ffmpeg process with the same encoder settings, the
+    segments are joined with the concat demuxer and the audio is muxed once.
+
+    Raises:
+        ffmpeg.Error: If a segment or the join fails, the other segments are stopped first.
+    """
+    bounds = segment_bounds(timeline, length, segments)
+    threads = max(1, multiprocessing.cpu_count() // len(bounds))
+    Path(segment_dir).mkdir(parents=True, exist_ok=True)
+    print_substep(f"Rendering {len(bounds)} segments in parallel...")
+
+    processes = list()
+    try:
+        for n, (start, end) in enumerate(bounds):
+            segment_timeline = [
+                dict(clip, start=max(clip["start"] - start, 0), end=clip["end"] - start)
+                for clip in timeline
+                if clip["end"] > start and clip["start"] < end
+            ]
+            process = (
+                compose_outputs(
+                    ffmpeg.input(background_path, ss=start, t=end - start).video,
+                    background_size,
+                    segment_timeline,
+                    outputs,
+                    [f"{segment_dir}/{i}-{n}.mp4" for i in range(len(outputs))],
+                    credit,
+                    profile,
+                    threads=threads,
+                )
+                .overwrite_output()
+                .global_args("-nostats", "-loglevel", "error")
+                .run_async(quiet=True)
+            )
+            processes.append((process, end - start))
+
+        done = 0
+        for process, duration in processes:
+            _, err = process.communicate()
+            if process.returncode:
+                raise ffmpeg.Error("ffmpeg", None, err)
+            done += duration
+            event = parse_progress({"out_time_us": str(int(done * 1000000))}, length)
+            for sink in sinks:
+                sink(event)
+    finally:
+        # a failed segment stops the others, they would keep the CPU busy for a failed job
+        for process, _ in processes:
+            if process.poll() is None:
+                process.terminate()
+                process.communicate()
+
+    joined = list()
+    for i, output in enumerate(outputs):
+        with open(f"{segment_dir}/{i}.txt", "w") as f:
+            for n in range(len(bounds)):
+                f.write(f"file '{i}-{n}.mp4'\n")
+        joined.append(ffmpeg.input(f"{segment_dir}/{i}.txt", f="concat", safe=0).video)
+    audios = split_stream(final_audio, len(outputs), "asplit")
+    ffmpeg.merge_outputs(
+        *[
+            ffmpeg.output(
+                joined[i],
+                audios[i],
+                output["path"],
+                f="mp4",
+                **{
+                    "c:v": "copy",
+                    "b:a": get_encoding_profile(profile)["b:a"],
+                },
+            )
+            for i, output in enumerate(outputs)
+        ]
+    ).overwrite_output().run(quiet=True)
+    event = parse_progress({"out_time_us": str(int(length * 1000000)), "progress": "end"}, length)
+    for sink in sinks:
+        sink(event)
+
+
+def make_contact_sheet(
+    background_path: str,
+    background_size: Tuple[int, int],
+    timeline: List[Dict],
+    credit: str,
+    W: int,
+    H: int,
+    path: str,
+    columns: int = 4,
+) -> str:
+    """Saves one frame from the middle of every clip of the timeline in a grid.
+
+    Args:
+        W (int): Width of every frame.
+        H (int): Height of every frame.
+        path (str): Where to save the contact sheet.
+        columns (int, optional): Frames per row.
+    """
+    frames = list()
+    for clip in track(timeline, "Grabbing the keyframes..."):
+        frame = ffmpeg.input(background_path, ss=(clip["start"] + clip["end"]) / 2).video
+        frame = crop_to_aspect(frame, *background_size, W, H)
+        frame = overlay_timeline(frame, [dict(clip, start=0, end=1)], W, H, credit)
+        png, _ = ffmpeg.output(frame, "pipe:", vframes=1, f="image2", vcodec="png").run(quiet=True)
+        frames.append(Image.open(io.BytesIO(png)))
+
+    rows = -(-len(frames) // columns)
+    sheet = Image.new("RGB", (min(len(frames), columns) * W, rows * H))
+    for i, frame in enumerate(frames):
+        sheet.paste(frame, ((i % columns) * W, (i // columns) * H))
+    sheet.save(path)
+    return path
+
+
+def render_draft(
+    background_path: str,
+    background_size: Tuple[int, int],
+    timeline: List[Dict],
+    final_audio,
+    credit: str,
+    W: int,
+    H: int,
+    folder: str,
+    filename: str,
+):
+    """Renders a quick preview from the same timeline as the final video.
+
+    The preview is half the resolution at DRAFT_FPS with the draft encoding profile, optionally
+    cut to the first draft_seconds, plus a contact sheet of every clip if enabled.
+    """
+    Path(folder).mkdir(parents=True, exist_ok=True)
+    draft_seconds = settings.get_config()["settings"]["draft_seconds"]
+    output = {"W": W // 4 * 2, "H": H // 4 * 2, "bitrate": None, "fps": DRAFT_FPS}
+    path = f"{folder}/{filename}"[:251] + ".mp4"
+
+    print_step("Rendering the draft 🎥")
+    try:
+        compose_outputs(
+            ffmpeg.input(background_path).video,
+            background_size,
+            timeline,
+            [output],
+            [path],
+            credit,
+            "draft",
+            audios=[final_audio],
+            duration=draft_seconds or None,
+        ).overwrite_output().run(quiet=True)
+    except ffmpeg.Error as e:
+        print(e.stderr.decode("utf8"))
+        exit(1)
+    print_substep(f"Draft saved to {path}", style="bold green")
+
+    if settings.get_config()["settings"]["draft_contact_sheet"]:
+        contact_sheet = make_contact_sheet(
+            background_path,
+            background_size,
+            timeline,
+            credit,
+            W // 8 * 2,
+            H // 8 * 2,
+            f"{folder}/{filename}"[:251] + ".png",
+        )
+        print_substep(f"Contact sheet saved to {contact_sheet}", style="bold green")
+
+
+def remux_audio(video_path: str, audio: ffmpeg, path: str, profile: str = None) -> str:
+    """Copies the already encoded video stream of video_path and pairs it with another audio track.
+
+    Used for the OnlyTTS variant so the composited video only has to be encoded once.
+
+    Args:
+        video_path (str): The rendered video whose video stream is reused as is.
+        audio (ffmpeg): The audio stream that replaces the original audio.
+        path (str): Where to save the remuxed video.
+        profile (str, optional): Name of the encoding profile used for the audio.
+    """
+    try:
+        ffmpeg.output(
+            ffmpeg.input(video_path).video,
+            audio,
+            path,
+            f="mp4",
+            **{
+                "c:v": "copy",
+                "b:a": get_encoding_profile(profile)["b:a"],
+            },
+        ).overwrite_output().run(quiet=True)
+    except ffmpeg.Error as e:
+        print(e.stderr.decode("utf8"))
+        exit(1)
+    return path
+
+
 def make_final_video(
     number_of_clips: int,
     length: int,
     reddit_obj: dict,
     background_config: Dict[str, Tuple],
 ):
-    """Gathers audio clips, gathers all screenshots, stitches them together and saves the final video to assets/temp
+    """Gathers audio clips, gathers all screenshots, stitches them together and saves the final video to the results folder
     Args:
         number_of_clips (int): Index to end at when going through the screenshots'
         length (int): Length of the video
@@ -199,68 +505,66 @@ def make_final_video(
         background_config (Tuple[str, str, str, Any]): The background config to use.
     """
     # settings values
-    W: Final[int] = int(settings.config["settings"]["resolution_w"])
-    H: Final[int] = int(settings.config["settings"]["resolution_h"])
+    W: Final[int] = int(settings.get_config()["settings"]["resolution_w"])
+    H: Final[int] = int(settings.get_config()["settings"]["resolution_h"])
 
-    opacity = settings.config["settings"]["opacity"]
+    opacity = settings.get_config()["settings"]["opacity"]
 
     reddit_id = re.sub(r"[^\w\s-]", "", reddit_obj["thread_id"])
+    temp = temp_dir(reddit_id)
 
     allowOnlyTTSFolder: bool = (
-        settings.config["settings"]["background"]["enable_extra_audio"]
-        and settings.config["settings"]["background"]["background_audio_volume"] != 0
+        settings.get_config()["settings"]["background"]["enable_extra_audio"]
+        and settings.get_config()["settings"]["background"]["background_audio_volume"] != 0
     )
 
     print_step("Creating the final video 🎥")
 
-    background_clip = ffmpeg.input(prepare_background(reddit_id, W=W, H=H))
+    background_path = f"{temp}/background.mp4"
+    background_stream = next(
+        stream
+        for stream in ffmpeg.probe(background_path)["streams"]
+        if stream["codec_type"] == "video"
+    )
 
     # Gather all audio clips
     audio_clips = list()
-    if number_of_clips == 0 and settings.config["settings"]["storymode"] == "false":
+    if number_of_clips == 0 and settings.get_config()["settings"]["storymode"] == "false":
         print(
             "No audio clips to gather. Please use a different TTS or post."
         )  # This is to fix the TypeError: unsupported operand type(s) for +: 'int' and 'NoneType'
         exit()
-    if settings.config["settings"]["storymode"]:
-        if settings.config["settings"]["storymodemethod"] == 0:
-            audio_clips = [ffmpeg.input(f"assets/temp/{reddit_id}/mp3/title.mp3")]
-            audio_clips.insert(1, ffmpeg.input(f"assets/temp/{reddit_id}/mp3/postaudio.mp3"))
-        elif settings.config["settings"]["storymodemethod"] == 1:
+    if settings.get_config()["settings"]["storymode"]:
+        if settings.get_config()["settings"]["storymodemethod"] == 0:
+            audio_clips = [ffmpeg.input(f"{temp}/mp3/title.mp3")]
+            audio_clips.insert(1, ffmpeg.input(f"{temp}/mp3/postaudio.mp3"))
+        elif settings.get_config()["settings"]["storymodemethod"] == 1:
             audio_clips = [
-                ffmpeg.input(f"assets/temp/{reddit_id}/mp3/postaudio-{i}.mp3")
+                ffmpeg.input(f"{temp}/mp3/postaudio-{i}.mp3")
                 for i in track(range(number_of_clips + 1), "Collecting the audio files...")
             ]
-            audio_clips.insert(0, ffmpeg.input(f"assets/temp/{reddit_id}/mp3/title.mp3"))
+            audio_clips.insert(0, ffmpeg.input(f"{temp}/mp3/title.mp3"))
 
     else:
-        audio_clips = [
-            ffmpeg.input(f"assets/temp/{reddit_id}/mp3/{i}.mp3") for i in range(number_of_clips)
-        ]
-        audio_clips.insert(0, ffmpeg.input(f"assets/temp/{reddit_id}/mp3/title.mp3"))
+        audio_clips = [ffmpeg.input(f"{temp}/mp3/{i}.mp3") for i in range(number_of_clips)]
+        audio_clips.insert(0, ffmpeg.input(f"{temp}/mp3/title.mp3"))
 
         audio_clips_durations = [
-            float(ffmpeg.probe(f"assets/temp/{reddit_id}/mp3/{i}.mp3")["format"]["duration"])
+            float(ffmpeg.probe(f"{temp}/mp3/{i}.mp3")["format"]["duration"])
             for i in range(number_of_clips)
         ]
         audio_clips_durations.insert(
             0,
-            float(ffmpeg.probe(f"assets/temp/{reddit_id}/mp3/title.mp3")["format"]["duration"]),
+            float(ffmpeg.probe(f"{temp}/mp3/title.mp3")["format"]["duration"]),
         )
-    audio_concat = ffmpeg.concat(*audio_clips, a=1, v=0)
-    ffmpeg.output(
-        audio_concat, f"assets/temp/{reddit_id}/audio.mp3", **{"b:a": "192k"}
-    ).overwrite_output().run(quiet=True)
+    # The clips are concatenated and mixed in the render itself so the audio is encoded only once
+    audio = ffmpeg.concat(*audio_clips, a=1, v=0)
 
     console.log(f"[bold green] Video Will Be: {length} Seconds Long")
 
-    screenshot_width = int((W * 45) // 100)
-    audio = ffmpeg.input(f"assets/temp/{reddit_id}/audio.mp3")
-    final_audio = merge_background_audio(audio, reddit_id)
-
-    image_clips = list()
+    final_audio = merge_background_audio(audio, background_config)
 
-    Path(f"assets/temp/{reddit_id}/png").mkdir(parents=True, exist_ok=True)
+    Path(f"{temp}/png").mkdir(parents=True, exist_ok=True)
 
     # Credits to tim (beingbored)
     # get the title_template image and draw a text in the middle part of it with the title of the thread
@@ -276,79 +580,53 @@ def make_final_video(
     # create_fancy_thumbnail(image, text, text_color, padding
     title_img = create_fancy_thumbnail(title_template, title, font_color, padding)
 
-    title_img.save(f"assets/temp/{reddit_id}/png/title.png")
-    image_clips.insert(
-        0,
-        ffmpeg.input(f"assets/temp/{reddit_id}/png/title.png")["v"].filter(
-            "scale", screenshot_width, -1
-        ),
-    )
+    title_img.save(f"{temp}/png/title.png")
 
+    # Every screenshot with the time it is shown, shared by all the outputs
+    timeline = list()
     current_time = 0
-    if settings.config["settings"]["storymode"]:
+    if settings.get_config()["settings"]["storymode"]:
         audio_clips_durations = [
-            float(
-                ffmpeg.probe(f"assets/temp/{reddit_id}/mp3/postaudio-{i}.mp3")["format"]["duration"]
-            )
+            float(ffmpeg.probe(f"{temp}/mp3/postaudio-{i}.mp3")["format"]["duration"])
             for i in range(number_of_clips)
         ]
         audio_clips_durations.insert(
             0,
-            float(ffmpeg.probe(f"assets/temp/{reddit_id}/mp3/title.mp3")["format"]["duration"]),
+            float(ffmpeg.probe(f"{temp}/mp3/title.mp3")["format"]["duration"]),
         )
-        if settings.config["settings"]["storymodemethod"] == 0:
-            image_clips.insert(
-                1,
-                ffmpeg.input(f"assets/temp/{reddit_id}/png/story_content.png").filter(
-                    "scale", screenshot_width, -1
-                ),
-            )
-            background_clip = background_clip.overlay(
-                image_clips[0],
-                enable=f"between(t,{current_time},{current_time + audio_clips_durations[0]})",
-                x="(main_w-overlay_w)/2",
-                y="(main_h-overlay_h)/2",
-            )
-            current_time += audio_clips_durations[0]
-        elif settings.config["settings"]["storymodemethod"] == 1:
-            for i in track(range(0, number_of_clips + 1), "Collecting the image files..."):
-                image_clips.append(
-                    ffmpeg.input(f"assets/temp/{reddit_id}/png/img{i}.png")["v"].filter(
-                        "scale", screenshot_width, -1
-                    )
-                )
-                background_clip = background_clip.overlay(
-                    image_clips[i],
-                    enable=f"between(t,{current_time},{current_time + audio_clips_durations[i]})",
-                    x="(main_w-overlay_w)/2",
-                    y="(main_h-overlay_h)/2",
-                )
-                current_time += audio_clips_durations[i]
+        if settings.get_config()["settings"]["storymodemethod"] == 0:
+            images = [f"{temp}/png/title.png"]
+        elif settings.get_config()["settings"]["storymodemethod"] == 1:
+            images = [f"{temp}/png/title.png"] + [
+                f"{temp}/png/img{i}.png"
+                for i in track(range(0, number_of_clips), "Collecting the image files...")
+            ]
+        image_opacity = None
     else:
-        for i in range(0, number_of_clips + 1):
-            image_clips.append(
-                ffmpeg.input(f"assets/temp/{reddit_id}/png/comment_{i}.png")["v"].filter(
-                    "scale", screenshot_width, -1
-                )
-            )
-            image_overlay = image_clips[i].filter("colorchannelmixer", aa=opacity)
-            assert (
-                audio_clips_durations is not None
-            ), "Please make a GitHub issue if you see this. Ping @JasonLovesDoggo on GitHub."
-            background_clip = background_clip.overlay(
-                image_overlay,
-                enable=f"between(t,{current_time},{current_time + audio_clips_durations[i]})",
-                x="(main_w-overlay_w)/2",
-                y="(main_h-overlay_h)/2",
-            )
-            current_time += audio_clips_durations[i]
+        assert (
+            audio_clips_durations is not None
+        ), "Please make a GitHub issue if you see this. Ping @JasonLovesDoggo on GitHub."
+        images = [f"{temp}/png/title.png"] + [
+            f"{temp}/png/comment_{i}.png" for i in range(0, number_of_clips)
+        ]
+        image_opacity = opacity
+    for i, image in enumerate(images):
+        timeline.append(
+            {
+                "image": image,
+                "start": current_time,
+                "end": current_time + audio_clips_durations[i],
+                "opacity": image_opacity,
+            }
+        )
+        current_time += audio_clips_durations[i]
 
     title = re.sub(r"[^\w\s-]", "", reddit_obj["thread_title"])
     idx = re.sub(r"[^\w\s-]", "", reddit_obj["thread_id"])
     title_thumb = reddit_obj["thread_title"]
 
     filename = f"{name_normalize(title)[:251]}"
-    subreddit = settings.config["reddit"]["thread"]["subreddit"]
+    subreddit = settings.get_config()["reddit"]["thread"]["subreddit"]
 
     if not exists(f"./results/{subreddit}"):
         print_substep("The 'results' folder could not be found so it was automatically created.")
@@ -359,7 +637,7 @@ def make_final_video(
         os.makedirs(f"./results/{subreddit}/OnlyTTS")
 
     # create a thumbnail for the video
-    settingsbackground = settings.config["settings"]["background"]
+    settingsbackground = settings.get_config()["settings"]["background"]
 
     if settingsbackground["background_thumbnail"]:
         if not exists(f"./results/{subreddit}/thumbnails"):
@@ -390,91 +668,89 @@ def make_final_video(
                 height,
                 title_thumb,
             )
-            thumbnailSave.save(f"./assets/temp/{reddit_id}/thumbnail.png")
-            print_substep(f"Thumbnail - Building Thumbnail in assets/temp/{reddit_id}/thumbnail.png")
+            thumbnailSave.save(f"{temp}/thumbnail.png")
+            print_substep(f"Thumbnail - Building Thumbnail in {temp}/thumbnail.png")
+
+    background_size = (int(background_stream["width"]), int(background_stream["height"]))
+    credit = background_config["video"][2]
+
+    if settings.get_config()["settings"]["draft_mode"]:
+        render_draft(
+            background_path,
+            background_size,
+            timeline,
+            final_audio,
+            credit,
+            W,
+            H,
+            f"results/{subreddit}/drafts",
+            filename,
+        )
+        print_step("Done! 🎉 The draft is in the results folder, the temporary files were kept 📁")
+        return
+
+    # The main video and every variant are rendered from one decode of the background
+    outputs = [{"W": W, "H": H, "bitrate": None, "folder": f"results/{subreddit}"}]
+    for variant in parse_variants(settings.get_config()["settings"]["variants"]):
+        variant["folder"] = f"results/{subreddit}/{variant['W']}x{variant['H']}"
+        outputs.append(variant)
+    for output in outputs:
+        path = output["folder"] + f"/{filename}"
+        # Prevent a error by limiting the path length, do not change this.
+        output["path"] = path[:251] + ".mp4"
+        Path(output["folder"]).mkdir(parents=True, exist_ok=True)
+        if allowOnlyTTSFolder:
+            Path(output["folder"] + "/OnlyTTS").mkdir(parents=True, exist_ok=True)
+
+    profile = settings.get_config()["settings"]["encoding_profile"] or DEFAULT_PROFILE
+    render_segments = int(settings.get_config()["settings"]["render_segments"] or 1)
 
-    text = f"Background by {background_config['video'][2]}"
-    background_clip = ffmpeg.drawtext(
-        background_clip,
-        text=text,
-        x=f"(w-text_w)",
-        y=f"(h-text_h)",
-        fontsize=5,
-        fontcolor="White",
-        fontfile=os.path.join("fonts", "Roboto-Regular.ttf"),
-    )
-    background_clip = background_clip.filter("scale", W, H)
     print_step("Rendering the video 🎥")
-    from tqdm import tqdm
-
-    pbar = tqdm(total=100, desc="Progress: ", bar_format="{l_bar}{bar}", unit=" %")
-
-    def on_update_example(progress) -> None:
-        status = round(progress * 100, 2)
-        old_percentage = pbar.n
-        pbar.update(status - old_percentage)
-
-    defaultPath = f"results/{subreddit}"
-    with ProgressFfmpeg(length, on_update_example) as progress:
-        path = defaultPath + f"/{filename}"
-        path = (
-            path[:251] + ".mp4"
-        )  # Prevent a error by limiting the path length, do not change this.
-        try:
-            ffmpeg.output(
-                background_clip,
+    sinks = [
+        TqdmSink(),
+        TraceSink("video_creation/data/render_trace.jsonl", reddit_id=reddit_id),
+        MetricsSink(reddit_id),
+    ]
+
+    try:
+        if render_segments > 1:
+            render_segmented(
+                background_path,
+                background_size,
+                timeline,
+                outputs,
                 final_audio,
-                path,
-                f="mp4",
-                **{
-                    "c:v": "h264",
-                    "b:v": "20M",
-                    "b:a": "192k",
-                    "threads": multiprocessing.cpu_count(),
-                },
-            ).overwrite_output().global_args("-progress", progress.output_file.name).run(
-                quiet=True,
-                overwrite_output=True,
-                capture_stdout=False,
-                capture_stderr=False,
+                credit,
+                profile,
+                length,
+                render_segments,
+                f"{temp}/segments",
+                sinks,
+            )
+        else:
+            run_ffmpeg(
+                compose_outputs(
+                    ffmpeg.input(background_path).video,
+                    background_size,
+                    timeline,
+                    outputs,
+                    [output["path"] for output in outputs],
+                    credit,
+                    profile,
+                    audios=split_stream(final_audio, len(outputs), "asplit"),
+                ).overwrite_output(),
+                length,
+                sinks,
             )
-        except ffmpeg.Error as e:
-            print(e.stderr.decode("utf8"))
-            exit(1)
-    old_percentage = pbar.n
-    pbar.update(100 - old_percentage)
+    except ffmpeg.Error as e:
+        print(e.stderr.decode("utf8"))
+        exit(1)
     if allowOnlyTTSFolder:
-        path = defaultPath + f"/OnlyTTS/{filename}"
-        path = (
-            path[:251] + ".mp4"
-        )  # Prevent a error by limiting the path length, do not change this.
-        print_step("Rendering the Only TTS Video 🎥")
-        with ProgressFfmpeg(length, on_update_example) as progress:
-            try:
-                ffmpeg.output(
-                    background_clip,
-                    audio,
-                    path,
-                    f="mp4",
-                    **{
-                        "c:v": "h264",
-                        "b:v": "20M",
-                        "b:a": "192k",
-                        "threads": multiprocessing.cpu_count(),
-                    },
-                ).overwrite_output().global_args("-progress", progress.output_file.name).run(
-                    quiet=True,
-                    overwrite_output=True,
-                    capture_stdout=False,
-                    capture_stderr=False,
-                )
-            except ffmpeg.Error as e:
-                print(e.stderr.decode("utf8"))
-                exit(1)
-
-        old_percentage = pbar.n
-        pbar.update(100 - old_percentage)
-    pbar.close()
+        print_step("Muxing the Only TTS Video 🎥")
+        for output in outputs:
+            onlytts_path = output["folder"] + f"/OnlyTTS/{filename}"
+            # Prevent a error by limiting the path length, do not change this.
+            remux_audio(output["path"], audio, onlytts_path[:251] + ".mp4", profile)
     save_data(subreddit, filename + ".mp4", title, idx, background_config["video"][2])
     print_step("Removing temporary files 🗑")
     cleanups = cleanup(reddit_id)
@@ -3,7 +3,6 @@ import re
 from pathlib import Path
 from typing import Dict, Final
 
-import translators
 from playwright.sync_api import ViewportSize, sync_playwright
 from rich.progress import track
 
@@ -12,35 +11,37 @@ from utils.console import print_step, print_substep
 from utils.imagenarator import imagemaker
 from utils.playwright import clear_cookie_by_name
 from utils.videos import save_data
+from utils.workspace import temp_dir
 
 __all__ = ["get_screenshots_of_reddit_posts"]
 
 
 def get_screenshots_of_reddit_posts(reddit_object: dict, screenshot_num: int):
-    """Downloads screenshots of reddit posts as seen on the web. Downloads to assets/temp/png
+    """Downloads screenshots of reddit posts as seen on the web. Downloads to the png folder of the workspace
 
     Args:
         reddit_object (Dict): Reddit object received from reddit/subreddit.py
         screenshot_num (int): Number of screenshots to download
     """
     # settings values
-    W: Final[int] = int(settings.config["settings"]["resolution_w"])
-    H: Final[int] = int(settings.config["settings"]["resolution_h"])
-    lang: Final[str] = settings.config["reddit"]["thread"]["post_lang"]
-    storymode: Final[bool] = settings.config["settings"]["storymode"]
+    W: Final[int] = int(settings.get_config()["settings"]["resolution_w"])
+    H: Final[int] = int(settings.get_config()["settings"]["resolution_h"])
+    lang: Final[str] = settings.get_config()["reddit"]["thread"]["post_lang"]
+    storymode: Final[bool] = settings.get_config()["settings"]["storymode"]
 
     print_step("Downloading screenshots of reddit posts...")
     reddit_id = re.sub(r"[^\w\s-]", "", reddit_object["thread_id"])
+    temp = temp_dir(reddit_id)
     # ! Make sure the reddit screenshots folder exists
-    Path(f"assets/temp/{reddit_id}/png").mkdir(parents=True, exist_ok=True)
+    Path(f"{temp}/png").mkdir(parents=True, exist_ok=True)
 
     # set the theme and disable non-essential cookies
-    if settings.config["settings"]["theme"] == "dark":
+    if settings.get_config()["settings"]["theme"] == "dark":
         cookie_file = open("./video_creation/data/cookie-dark-mode.json", encoding="utf-8")
         bgcolor = (33, 33, 36, 255)
         txtcolor = (240, 240, 240)
         transparent = False
-    elif settings.config["settings"]["theme"] == "transparent":
+    elif settings.get_config()["settings"]["theme"] == "transparent":
         if storymode:
             # Transparent theme
             bgcolor = (0, 0, 0, 0)
@@ -59,7 +60,7 @@ def get_screenshots_of_reddit_posts(reddit_object: dict, screenshot_num: int):
         txtcolor = (0, 0, 0)
         transparent = False
 
-    if storymode and settings.config["settings"]["storymodemethod"] == 1:
+    if storymode and settings.get_config()["settings"]["storymodemethod"] == 1:
         # for idx,item in enumerate(reddit_object["thread_post"]):
         print_substep("Generating images...")
         return imagemaker(
@@ -100,8 +101,12 @@ def get_screenshots_of_reddit_posts(reddit_object: dict, screenshot_num: int):
         page.set_viewport_size(ViewportSize(width=1920, height=1080))
         page.wait_for_load_state()
 
-        page.locator(f'input[name="username"]').fill(settings.config["reddit"]["creds"]["username"])
-        page.locator(f'input[name="password"]').fill(settings.config["reddit"]["creds"]["password"])
+        page.locator(f'input[name="username"]').fill(
+            settings.get_config()["reddit"]["creds"]["username"]
+        )
+        page.locator(f'input[name="password"]').fill(
+            settings.get_config()["reddit"]["creds"]["password"]
+        )
         page.get_by_role("button", name="Log In").click()
         page.wait_for_timeout(5000)
 
@@ -156,6 +161,8 @@ def get_screenshots_of_reddit_posts(reddit_object: dict, screenshot_num: int):
 
         if lang:
             print_substep("Translating post...")
+            import translators  # slow to import, only needed to translate
+
             texts_in_tl = translators.translate_text(
                 reddit_object["thread_title"],
                 to_language=lang,
@@ -169,11 +176,11 @@ def get_screenshots_of_reddit_posts(reddit_object: dict, screenshot_num: int):
         else:
             print_substep("Skipping translation...")
 
-        postcontentpath = f"assets/temp/{reddit_id}/png/title.png"
+        postcontentpath = f"{temp}/png/title.png"
         try:
-            if settings.config["settings"]["zoom"] != 1:
+            if settings.get_config()["settings"]["zoom"] != 1:
                 # store zoom settings
-                zoom = settings.config["settings"]["zoom"]
+                zoom = settings.get_config()["settings"]["zoom"]
                 # zoom the body of the page
                 page.evaluate("document.body.style.zoom=" + str(zoom))
                 # as zooming the body doesn't change the properties of the divs, we need to adjust for the zoom
@@ -204,7 +211,7 @@ def get_screenshots_of_reddit_posts(reddit_object: dict, screenshot_num: int):
 
         if storymode:
             page.locator('[data-click-id="text"]').first.screenshot(
-                path=f"assets/temp/{reddit_id}/png/story_content.png"
+                path=f"{temp}/png/story_content.png"
             )
         else:
             for idx, comment in enumerate(
@@ -224,20 +231,22 @@ def get_screenshots_of_reddit_posts(reddit_object: dict, screenshot_num: int):
 
                 # translate code
 
-                if settings.config["reddit"]["thread"]["post_lang"]:
+                if settings.get_config()["reddit"]["thread"]["post_lang"]:
+                    import translators  # slow to import, only needed to translate
+
                     comment_tl = translators.translate_text(
                         comment["comment_body"],
                         translator="google",
-                        to_language=settings.config["reddit"]["thread"]["post_lang"],
+                        to_language=settings.get_config()["reddit"]["thread"]["post_lang"],
                     )
                     page.evaluate(
                         '([tl_content, tl_id]) => document.querySelector(`#t1_${tl_id} > div:nth-child(2) > div > div[data-testid="comment"] > div`).textContent = tl_content',
                         [comment_tl, comment["comment_id"]],
                     )
                 try:
-                    if settings.config["settings"]["zoom"] != 1:
+                    if settings.get_config()["settings"]["zoom"] != 1:
                         # store zoom settings
-                        zoom = settings.config["settings"]["zoom"]
+                        zoom = settings.get_config()["settings"]["zoom"]
                         # zoom the body of the page
                         page.evaluate("document.body.style.zoom=" + str(zoom))
                         # scroll comment into view
@@ -248,11 +257,11 @@ def get_screenshots_of_reddit_posts(reddit_object: dict, screenshot_num: int):
                             location[i] = float("{:.2f}".format(location[i] * zoom))
                         page.screenshot(
                             clip=location,
-                            path=f"assets/temp/{reddit_id}/png/comment_{idx}.png",
+                            path=f"{temp}/png/comment_{idx}.png",
                         )
                     else:
                         page.locator(f"#t1_{comment['comment_id']}").screenshot(
-                            path=f"assets/temp/{reddit_id}/png/comment_{idx}.png"
+                            path=f"{temp}/png/comment_{idx}.png"
                         )
                 except TimeoutError:
                     del reddit_object["comments"]
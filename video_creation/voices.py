@@ -1,26 +1,22 @@
+from importlib import import_module
 from typing import Tuple
 
 from rich.console import Console
 
-from TTS.aws_polly import AWSPolly
-from TTS.elevenlabs import elevenlabs
 from TTS.engine_wrapper import TTSEngine
-from TTS.GTTS import GTTS
-from TTS.pyttsx import pyttsx
-from TTS.streamlabs_polly import StreamlabsPolly
-from TTS.TikTok import TikTok
 from utils import settings
 from utils.console import print_step, print_table
 
 console = Console()
 
+# module and class of every provider, only the chosen one is imported (boto3, elevenlabs, ... are slow)
 TTSProviders = {
-    "GoogleTranslate": GTTS,
-    "AWSPolly": AWSPolly,
-    "StreamlabsPolly": StreamlabsPolly,
-    "TikTok": TikTok,
-    "pyttsx": pyttsx,
-    "ElevenLabs": elevenlabs,
+    "GoogleTranslate": ("TTS.GTTS", "GTTS"),
+    "AWSPolly": ("TTS.aws_polly", "AWSPolly"),
+    "StreamlabsPolly": ("TTS.streamlabs_polly", "StreamlabsPolly"),
+    "TikTok": ("TTS.TikTok", "TikTok"),
+    "pyttsx": ("TTS.pyttsx", "pyttsx"),
+    "ElevenLabs": ("TTS.elevenlabs", "elevenlabs"),
 }
 
 
@@ -34,9 +30,9 @@ def save_text_to_mp3(reddit_obj) -> Tuple[int, int]:
         tuple[int,int]: (total length of the audio, the number of comments audio was generated for)
     """
 
-    voice = settings.config["settings"]["tts"]["voice_choice"]
+    voice = settings.get_config()["settings"]["tts"]["voice_choice"]
     if str(voice).casefold() in map(lambda _: _.casefold(), TTSProviders):
-        text_to_mp3 = TTSEngine(get_case_insensitive_key_value(TTSProviders, voice), reddit_obj)
+        text_to_mp3 = TTSEngine(load_provider(voice), reddit_obj)
     else:
         while True:
             print_step("Please choose one of the following TTS providers: ")
@@ -45,7 +41,7 @@ def save_text_to_mp3(reddit_obj) -> Tuple[int, int]:
             if choice.casefold() in map(lambda _: _.casefold(), TTSProviders):
                 break
             print("Unknown Choice")
-        text_to_mp3 = TTSEngine(get_case_insensitive_key_value(TTSProviders, choice), reddit_obj)
+        text_to_mp3 = TTSEngine(load_provider(choice), reddit_obj)
     return text_to_mp3.run()
 
 
@@ -54,3 +50,8 @@ def get_case_insensitive_key_value(input_dict, key):
         (value for dict_key, value in input_dict.items() if dict_key.lower() == key.lower()),
         None,
     )
+
+
+def load_provider(name: str):
+    module, provider = get_case_insensitive_key_value(TTSProviders, name)
+    return getattr(import_module(module), provider)